@@ -0,0 +1,131 @@
+"""
+Droid Bot Assistant > bench_dice.py | Benchmark suite for the dice subsystem.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+
+Usage: python bench_dice.py [--output results.json] [--compare baseline.json] [--threshold 0.2]
+
+Times Roll, check_roll, group_roll, group_check_roll and every die class in diceLookup
+across pool sizes and group sizes, and writes the results to JSON so runs on different
+commits can be compared. With --compare it exits non zero if any benchmark got slower
+than the baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from time import perf_counter, strftime, localtime
+
+from dice import (diceLookup, Roll, check_roll, group_roll, group_check_roll, DiceSource)
+
+POOL_SIZES = [1, 5, 10, 25, 50, 100]
+GROUP_SIZES = [1, 5, 25, 100, 500]
+#The dice every group check is made against.
+CHECK_DICE = 'ddc'
+
+def time_it(function, repeat = 5, budget = 0.2) -> float:
+    """
+    Returns the best time per call in seconds. Each of the repeat runs calls the function enough
+    times to take about budget seconds, so the fast ones aren't lost in the timer's resolution.
+    """
+    calls = 1
+    while True:
+        start = perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = perf_counter() - start
+        if elapsed >= budget / 10 or calls >= 1 << 20:
+            break
+        calls *= 2
+    calls = max(1, int(calls * budget / 10 / max(elapsed, 1e-9)))
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, (perf_counter() - start) / calls)
+    return best
+
+def group_of(size: int) -> dict:
+    """
+    A made up Group.skill_dice_list() result for size players, with a spread of [pro, ability].
+    """
+    return {f"player{i}" : [i % 3, 1 + i % 4] for i in range(size)}
+
+def benchmarks(source: DiceSource) -> dict:
+    """
+    Returns a dict of benchmark name to the function to time.
+    """
+    cases = dict()
+    for letter, die in diceLookup.items():
+        cases[f"die/{die.__name__}"] = lambda die=die: die(source)
+    for size in POOL_SIZES:
+        pool = ('pa' * size)[:size]
+        cases[f"roll/{size}"] = lambda pool=pool: Roll(pool, rng=source).description
+        cases[f"check_roll/{size}"] = lambda size=size: check_roll([size // 2, size - size // 2], CHECK_DICE, source).description
+    for size in GROUP_SIZES:
+        group = group_of(size)
+        cases[f"group_roll/{size}"] = lambda group=group: group_roll(group, source)
+        cases[f"group_check_roll/{size}"] = lambda group=group: group_check_roll(group, CHECK_DICE, source)
+    return cases
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+def run(only = None) -> dict:
+    source = DiceSource(seed=0)
+    results = dict()
+    for name, function in benchmarks(source).items():
+        if only != None and only not in name:
+            continue
+        results[name] = time_it(function)
+        print(f"{name:<28} {results[name] * 1e6:12.2f} us")
+    return {'commit' : commit(), 'time' : strftime("%Y-%m-%d %H:%M:%S", localtime()),
+        'python' : platform.python_version(), 'results' : results}
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    Returns a line for every benchmark that is slower than the baseline by more than threshold, a fraction.
+    """
+    regressions = list()
+    for name, seconds in current['results'].items():
+        old = baseline['results'].get(name)
+        if old == None:
+            continue
+        change = seconds / old - 1
+        if change > threshold:
+            regressions.append(f"{name}: {old * 1e6:.2f} us -> {seconds * 1e6:.2f} us ({change:+.0%})")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the dice subsystem.")
+    parser.add_argument('--output', help="JSON file to write the results to")
+    parser.add_argument('--compare', help="JSON results of an earlier run to check against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slow down before it counts as a regression, default 0.2 (20%%)")
+    parser.add_argument('--only', help="Only run benchmarks with this in their name")
+    args = parser.parse_args()
+
+    current = run(args.only)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {baseline.get('commit') or args.compare}:")
+            print('\n'.join(regressions))
+            return 1
+        print(f"\nNo regressions against {baseline.get('commit') or args.compare}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
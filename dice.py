@@ -6,50 +6,143 @@ This file is part of 'Droid Assistant Bot', which is released under the MIT lice
 Please see the license file that was included with this software.
 """
 
-from random import randrange
-from collections import Counter
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, wait
+from statistics import NormalDist
+from time import monotonic
+from threading import Lock
+import os
+import random
+import re
+import numpy as np
+
+from workers import WORKERS, get_executor
+
+class DiceError(ValueError):
+    """Raised for dice expressions or pools that can't be rolled."""
+    pass
+
+class DiceSource(object):
+    """
+    Where the dice get their randomness from. Single dice, and the dice of a single Roll, come
+    from a random.Random, since a numpy call costs a couple of microseconds before it does anything,
+    about 4 times a whole randrange(). Whole batches for roll_pools() come from a numpy Generator.
+    Both are seeded from self.seed, so the same commands replay the same rolls.
+
+    entropy is either 'numpy', seeded as above, or 'urandom' for os.urandom.
+    A numpy source is always seeded, with a fresh random seed if none is given, so self.seed
+    can be given to replay() to get the exact same rolls again. urandom can't be replayed.
+    """
+    def __init__(self, seed = None, entropy = 'numpy') -> None:
+        if entropy not in ['numpy', 'urandom']:
+            raise ValueError(f"Unknown entropy {entropy!r}")
+        if entropy == 'urandom' and seed != None:
+            raise ValueError("os.urandom can't be seeded")
+        if entropy == 'numpy' and seed == None:
+            seed = int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
+        self.seed = seed
+        self.entropy = entropy
+        if entropy == 'numpy':
+            self.generator = np.random.default_rng(seed)
+            self.random = random.Random(seed)
+        else:
+            self.generator = None
+            self.random = random.SystemRandom()
+        self.randrange = self.random.randrange #Bound once, it's called for every die
+
+    def integers(self, high: int, size = None):
+        """
+        Same form as numpy's Generator.integers(high, size), ints from 0 up to, not including, high.
+        """
+        if size == None:
+            return self.randrange(high)
+        if self.generator != None:
+            return self.generator.integers(high, size=size)
+        #Top 53 bits of each 64 bit word, same as numpy does to make a double.
+        count = int(np.prod(size))
+        words = np.frombuffer(os.urandom(count * 8), dtype=np.uint64)
+        return ((words >> np.uint64(11)) * (high / (1 << 53))).astype(np.int64).reshape(size)
+
+    def replay(self) -> 'DiceSource':
+        """
+        Returns a new source that will give back the same rolls this one has from the start.
+        """
+        if self.entropy != 'numpy':
+            raise ValueError("os.urandom rolls can't be replayed")
+        return DiceSource(self.seed, self.entropy)
+
+#Used for every roll not given a source of its own.
+source = DiceSource()
+
+#How many chats keep a source of their own. Past that the least recently used chat's is dropped,
+#   and it starts over on a new seed next time it rolls.
+CHAT_SOURCES = 1024
+#Seperate sources per chat, so a session's rolls can be seeded and replayed. Least recently used first.
+chatSources = OrderedDict()
+chatSourcesLock = Lock()
+
+def chat_source(chatId: int) -> DiceSource:
+    """
+    Returns the DiceSource for a chat, starting a new randomly seeded one if it has none.
+    """
+    with chatSourcesLock:
+        if chatId in chatSources:
+            chatSources.move_to_end(chatId)
+            return chatSources[chatId]
+    return seed_chat(chatId, None)
+
+def seed_chat(chatId: int, seed: int) -> DiceSource:
+    """
+    Start the chat over on a new source seeded with seed.
+    """
+    with chatSourcesLock:
+        chatSources[chatId] = DiceSource(seed)
+        chatSources.move_to_end(chatId)
+        while len(chatSources) > CHAT_SOURCES:
+            chatSources.popitem(last=False)
+        return chatSources[chatId]
 
 class Dice(str):
-    def __new__(cls, sides): #Recieve all the possible sides from the inherited class.
-        side = sides[randrange(len(sides))] #Every time a new dice is created Dice.side points to the rolled result.
-        return super(Dice, cls).__new__(cls, side)
-        #self.data = self.sides[randrange(len(self.sides))]
+    def __new__(cls, sides, rng = None): #Recieve all the possible sides from the inherited class.
+        side = sides[(source if rng == None else rng).randrange(len(sides))] #Every time a new dice is created Dice.side points to the rolled result.
+        return str.__new__(cls, side) #Not super(), looking it up costs as much as the roll
 
 class ProDice(Dice):
-    def __new__(cls):
-        cls.sides = ['','a','aa','aa','s','s','ss','ss','sa','sa','sa','x'] #Triumph is 'x', 't' is for threat
-        return super().__new__(cls, cls.sides)
+    sides = ['','a','aa','aa','s','s','ss','ss','sa','sa','sa','x'] #Triumph is 'x', 't' is for threat
+    def __new__(cls, rng = None):
+        return super().__new__(cls, cls.sides, rng)
 
 class AbilityDice(Dice):
-    def __new__(cls):
-        cls.sides = ['','a','a','aa','s','s','sa','ss']
-        return super().__new__(cls, cls.sides)
+    sides = ['','a','a','aa','s','s','sa','ss']
+    def __new__(cls, rng = None):
+        return super().__new__(cls, cls.sides, rng)
 
 class DiffDice(Dice):
-    def __new__(cls):
-        cls.sides = ['','t','t','t','tt','tf','f','ff']
-        return super().__new__(cls, cls.sides)
+    sides = ['','t','t','t','tt','tf','f','ff']
+    def __new__(cls, rng = None):
+        return super().__new__(cls, cls.sides, rng)
 
 class ChalDice(Dice):
-    def __new__(cls):
-        cls.sides = ['','t','t','tt','tt','f','f','tf','tf','ff','ff','d']
-        return super().__new__(cls, cls.sides)
+    sides = ['','t','t','tt','tt','f','f','tf','tf','ff','ff','d']
+    def __new__(cls, rng = None):
+        return super().__new__(cls, cls.sides, rng)
 
 class BoostDice(Dice):
-    def __new__(cls):
-        cls.sides = ['','','a','as','aa','s']
-        return super().__new__(cls, cls.sides)
+    sides = ['','','a','as','aa','s']
+    def __new__(cls, rng = None):
+        return super().__new__(cls, cls.sides, rng)
 
 class SetBackDice(Dice):
-    def __new__(cls):
-        cls.sides = ['','','t','t','f','f']
-        return super().__new__(cls, cls.sides)
+    sides = ['','','t','t','f','f']
+    def __new__(cls, rng = None):
+        return super().__new__(cls, cls.sides, rng)
 
 class ForceDice(Dice):
-    def __new__(cls):
-        #b for darkside, l for lightside
-        cls.sides = ['b', 'b', 'b', 'b', 'b', 'b', 'l', 'l', 'll', 'll', 'll', 'bb']
-        return super().__new__(cls, cls.sides)
+    #b for darkside, l for lightside
+    sides = ['b', 'b', 'b', 'b', 'b', 'b', 'l', 'l', 'll', 'll', 'll', 'bb']
+    def __new__(cls, rng = None):
+        return super().__new__(cls, cls.sides, rng)
 
 diceLookup = {'p' : ProDice, 'a' : AbilityDice, 'd' : DiffDice, 'c' : ChalDice,
             'b' : BoostDice, 's' : SetBackDice, 'f' : ForceDice}
@@ -57,70 +150,671 @@ diceLookup = {'p' : ProDice, 'a' : AbilityDice, 'd' : DiffDice, 'c' : ChalDice,
 resultLookupName = {'a' : 'Advantage', 's' : 'Success', 'd' : 'Dispair', 'x' : 'Triumph',
             't' : 'Threat', 'f' : 'Failure', 'b' : 'Darkside', 'l' : 'Lightside'}
 
-class Roll(list):
-    def __init__(self, dice: str) -> None:
-        for die in dice:
-            self.append(diceLookup[die]())
-        result = str()
-        for die in self:
-            result += die
-        self.string = result
+#Order of the symbols in every tally array the batch engine returns. Matches resultLookupName.
+SYMBOLS = ['s', 'a', 'x', 't', 'f', 'd', 'l', 'b']
+#Order of the dice in every pool vector. Matches diceLookup.
+DICE = list(diceLookup.keys())
+
+def face_vectors(sides: list) -> np.ndarray:
+    """
+    Turn a die's list of sides into an array of shape (sides, symbols), each row
+    being how many of every symbol in SYMBOLS that side shows.
+    """
+    faces = np.zeros((len(sides), len(SYMBOLS)), dtype=np.int64)
+    for row, side in enumerate(sides):
+        for letter in side:
+            faces[row, SYMBOLS.index(letter)] += 1
+    return faces
+
+#Built once at import, the face count table for each die letter.
+faceLookup = {die : face_vectors(diceLookup[die].sides) for die in DICE}
+#Every side of every die numbered in one run, DICE order, for face histograms. A die's sides start at its offset.
+faceOffsets = dict(zip(DICE, np.cumsum([0] + [len(faceLookup[die]) for die in DICE[:-1]]).tolist()))
+FACE_COUNT = sum(len(faces) for faces in faceLookup.values())
+
+#Full die names that can be used in a dice expression in place of the letter.
+dieNames = {'proficiency' : 'p', 'ability' : 'a', 'difficulty' : 'd', 'challenge' : 'c',
+            'boost' : 'b', 'setback' : 's', 'force' : 'f'}
+
+#One token of a dice expression, tried in this order. Upgrades first so 'upgrade difficulty' isn't read as a die.
+#   Only a count may come before a die, so the space in 'aa downgrade' isn't read as part of a 'd'.
+diceToken = re.compile(r"""
+    (?P<change>upgrade|downgrade)\s*(?P<side>difficulty|diff)?\s*(?P<times>\d+)?
+    |(?:(?P<count>\d+)\s*)?(?P<name>proficiency|ability|difficulty|challenge|boost|setback|force)s?
+    |(?:(?P<number>\d+)\s*)?(?P<letter>[pabcdsf])
+    |(?P<space>[\s+,]+)
+    """, re.VERBOSE)
+
+def upgrade(high, low, times: int) -> tuple:
+    """
+    Upgrade times low dice into high dice, like ability into proficiency. Once out of low dice,
+    every other upgrade adds a low die and the next one upgrades it. Works on ints or numpy arrays.
+    """
+    upgraded = np.minimum(times, low)
+    left = times - upgraded
+    return high + upgraded + left // 2, low - upgraded + left % 2
+
+def downgrade(high, low, times: int) -> tuple:
+    """
+    Downgrade times high dice into low dice. Downgrades with no high dice left do nothing.
+    """
+    downgraded = np.minimum(times, high)
+    return high - downgraded, low + downgraded
+
+#'p' and 'a' sit side by side in DICE, so a player's [pro, ability] adds onto a pool as one slice.
+SKILL_COLUMNS = slice(DICE.index('p'), DICE.index('a') + 1)
+
+class PoolSpec(object):
+    """
+    A compiled dice expression. self.counts is the canonical die count vector, in DICE order,
+    and the upgrades and downgrades are kept seperate until resolve() since they have to be
+    applied after a player's skill dice are added to the pool. self.pool is the pool as it
+    resolves with no skill dice, worked out once up front.
+    """
+    __slots__ = ('counts', 'upgrades', 'downgrades', 'diffUpgrades', 'diffDowngrades', 'changed', 'pool')
+
+    def __init__(self, counts: tuple, upgrades = 0, downgrades = 0, diffUpgrades = 0, diffDowngrades = 0) -> None:
+        self.counts = counts
+        self.upgrades = upgrades
+        self.downgrades = downgrades
+        self.diffUpgrades = diffUpgrades
+        self.diffDowngrades = diffDowngrades
+        self.changed = bool(upgrades or downgrades or diffUpgrades or diffDowngrades)
+        self.pool = np.array(counts, dtype=np.int64)
+        if self.changed:
+            self.pool = self.__resolve__(np.zeros(2, dtype=np.int64))
+        self.pool.flags.writeable = False #Shared by every resolve(), so nobody gets to change it
+
+    def __repr__(self) -> str:
+        return f"PoolSpec({self.counts}, {self.upgrades}, {self.downgrades}, {self.diffUpgrades}, {self.diffDowngrades})"
+
+    def count(self, die: str) -> int:
+        return self.counts[DICE.index(die)]
+
+    def resolve(self, skillDice = None) -> np.ndarray:
+        """
+        Returns the final pool vector once the [pro, ability] skillDice are added and the upgrades
+        and downgrades are applied. skillDice can also be an array of them, one row per player,
+        which gives an array of pool vectors. Without skillDice it's self.pool, which can't be changed.
+        """
+        if skillDice is None: #Not ==, which numpy would do per element
+            return self.pool
+        if not self.changed:
+            #Nothing to upgrade, the common check, so it's just the skill dice on top of self.pool.
+            pools = np.empty(np.shape(skillDice)[:-1] + (len(DICE),), dtype=np.int64)
+            pools[...] = self.pool
+            pools[..., SKILL_COLUMNS] += skillDice
+            return pools
+        return self.__resolve__(np.asarray(skillDice, dtype=np.int64))
+
+    def __resolve__(self, skillDice: np.ndarray) -> np.ndarray:
+        pools = np.empty(skillDice.shape[:-1] + (len(DICE),), dtype=np.int64)
+        pools[...] = self.counts
+        pools[..., SKILL_COLUMNS] += skillDice
+        p, a, d, c = (DICE.index(die) for die in 'padc')
+        pools[..., p], pools[..., a] = upgrade(pools[..., p], pools[..., a], self.upgrades)
+        pools[..., p], pools[..., a] = downgrade(pools[..., p], pools[..., a], self.downgrades)
+        pools[..., c], pools[..., d] = upgrade(pools[..., c], pools[..., d], self.diffUpgrades)
+        pools[..., c], pools[..., d] = downgrade(pools[..., c], pools[..., d], self.diffDowngrades)
+        return pools
+
+#Most dice an expression can roll, counting every upgrade as a die since it can add one.
+POOL_LIMIT = 100
+
+@lru_cache(maxsize=256)
+def compile_pool(text: str) -> PoolSpec:
+    """
+    Compile a dice expression into a PoolSpec. Cached on the raw text so repeated commands
+    skip the parsing. Understands bare letters like 'ppadd', counts like '3p2a+2d1c',
+    names like '+boost' or '2 setback', and 'upgrade 2', 'downgrade 1', 'upgrade difficulty 1'.
+    Raises DiceError for more than POOL_LIMIT dice.
+    """
+    text = text.lower()
+    counts = [0] * len(DICE)
+    changes = {('upgrade', False) : 0, ('downgrade', False) : 0, ('upgrade', True) : 0, ('downgrade', True) : 0}
+    position = 0
+    while position < len(text):
+        token = diceToken.match(text, position)
+        if token == None:
+            raise DiceError(f"Dice {text[position]!r} not recognized.")
+        position = token.end()
+        if token['change']:
+            changes[(token['change'], token['side'] != None)] += int(token['times'] or 1)
+        elif token['name']:
+            counts[DICE.index(dieNames[token['name']])] += int(token['count'] or 1)
+        elif token['letter']:
+            counts[DICE.index(token['letter'])] += int(token['number'] or 1)
+    if sum(counts) + changes[('upgrade', False)] + changes[('upgrade', True)] > POOL_LIMIT:
+        raise DiceError(f"That's too many dice, the most that can be rolled at once is {POOL_LIMIT}.")
+    for times in changes.values():
+        if times > POOL_LIMIT: #Downgrades add no dice, but still have to fit in the pool's int64s
+            raise DiceError(f"Can't change more than {POOL_LIMIT} dice at once.")
+    return PoolSpec(tuple(counts), changes[('upgrade', False)], changes[('downgrade', False)],
+        changes[('upgrade', True)], changes[('downgrade', True)])
+
+def pool_vector(dice) -> np.ndarray:
+    """
+    Turn dice into a vector of how many of each die in DICE order. dice can be a dice expression
+    str, like 'ppadd', a compiled PoolSpec, or already a pool vector.
+    """
+    if isinstance(dice, str):
+        dice = compile_pool(dice)
+    if isinstance(dice, PoolSpec):
+        return dice.resolve()
+    return np.asarray(dice, dtype=np.int64)
+
+def roll_pools(pools, rng = None, keepFaces = False) -> 'RollBatch':
+    """
+    The batch engine. Is given an array of pool vectors, shape (hands, dice), and rolls
+    every hand at once. Each die type is rolled as one block for all the hands, sized to the
+    biggest hand, with the dice a hand doesn't have masked out before tallying.
+    rng is the DiceSource, or numpy Generator, to roll with. The module's source if not given.
+    If keepFaces is True the batch also keeps how many times each hand rolled every side, see faceOffsets.
+    """
+    if rng == None:
+        rng = source
+    pools = np.atleast_2d(np.asarray(pools, dtype=np.int64))
+    hands = pools.shape[0]
+    tally = np.zeros((hands, len(SYMBOLS)), dtype=np.int64)
+    histogram = np.zeros((hands, FACE_COUNT), dtype=np.int64) if keepFaces else None
+    for column, die in enumerate(DICE):
+        most = pools[:, column].max(initial=0)
+        if most == 0:
+            continue
+        faces = faceLookup[die]
+        rolled = rng.integers(len(faces), size=(hands, most))
+        inHand = np.arange(most) < pools[:, column, None]
+        tally += (faces[rolled] * inHand[..., None]).sum(axis=1)
+        if keepFaces:
+            #Number each hand's sides into its own run of FACE_COUNT so one bincount counts them all.
+            index = rolled + faceOffsets[die] + np.arange(hands)[:, None] * FACE_COUNT
+            histogram += np.bincount(index[inHand], minlength=hands * FACE_COUNT).reshape(hands, FACE_COUNT)
+    return RollBatch(tally, pools, histogram)
+
+class RollBatch(object):
+    """
+    The results of rolling many hands at once. self.tally is an array of shape (hands, symbols),
+    one column per letter in SYMBOLS, and each named column is available as a property.
+    self.faces is the face histogram of each hand, shape (hands, FACE_COUNT), if it was kept.
+    """
+    def __init__(self, tally: np.ndarray, pools: np.ndarray, faces = None) -> None:
+        self.tally = tally
+        self.pools = pools
+        self.faces = faces
+
+    def __len__(self) -> int:
+        return len(self.tally)
+
+    success = property(lambda self: self.tally[:, 0])
+    advantage = property(lambda self: self.tally[:, 1])
+    triumph = property(lambda self: self.tally[:, 2])
+    threat = property(lambda self: self.tally[:, 3])
+    failure = property(lambda self: self.tally[:, 4])
+    despair = property(lambda self: self.tally[:, 5])
+    light = property(lambda self: self.tally[:, 6])
+    dark = property(lambda self: self.tally[:, 7])
+
+    @property
+    def netSuccess(self) -> np.ndarray:
+        """Triumphs count as successes and despairs as failures."""
+        return self.success + self.triumph - self.failure - self.despair
+
+    @property
+    def netAdvantage(self) -> np.ndarray:
+        return self.advantage - self.threat
+
+    def counter(self, hand: int) -> Counter:
+        """
+        Returns the tally of a single hand in the same Counter form as Roll.tally.
+        """
+        return Counter({resultLookupName[letter] : int(count) for letter, count in zip(SYMBOLS, self.tally[hand])})
+
+    def description(self, hand: int) -> str:
+        return describe(self.counter(hand))
+
+    def breakdown(self, hand: int) -> str:
+        return breakdown(self.counter(hand), self.pools[hand, DICE.index('f')] > 0)
+
+def describe(tally: Counter) -> str:
+    """
+    Format the SUCCEEDED/FAILED line for a tally of result names.
+    """
+    netSuccess = tally['Success'] + tally['Triumph'] - tally['Failure'] - tally['Dispair']
+    return describe_net(netSuccess, tally['Advantage'] - tally['Threat'])
+
+def describe_net(netSuccess: int, netAdvantage: int) -> str:
+    """
+    Format the SUCCEEDED/FAILED line straight from the net success and advantage of a hand.
+    """
+    description = f"{'SUCCEEDED' if netSuccess > 0 else 'FAILED'} "
+    if netAdvantage < 0:
+        description += f"with {-netAdvantage} threat"
+    if netAdvantage > 0:
+        description += f"with {netAdvantage} advantage"
+    return description
+
+def breakdown(tally: Counter, force = False) -> str:
+    """
+    Format the count of every symbol for a tally of result names. Force results only if force dice were rolled.
+    """
+    result = f"\nTriumph: {tally['Triumph']}, Success: {tally['Success']}, Advantage: {tally['Advantage']},\n" + \
+        f"Dispair: {tally['Dispair']}, Failure: {tally['Failure']}, Threat: {tally['Threat']}"
+    if force:
+        result += f"\nLightside: {tally['Lightside']}, Darkside: {tally['Darkside']}"
+    return result
+
+#Each side of each die as the index in SYMBOLS of every symbol on it, for rolling a single hand in plain Python.
+faceSymbols = {die : [[SYMBOLS.index(letter) for letter in side] for side in diceLookup[die].sides] for die in DICE}
+#The name of each symbol, in SYMBOLS order.
+SYMBOL_NAMES = [resultLookupName[letter] for letter in SYMBOLS]
+
+class Roll(object):
+    """
+    The result of rolling one hand of dice. The count of each symbol, in SYMBOLS order, is kept
+    in self.counts, and the tally, description and breakdown text are made up front since
+    nearly every roll is shown. If keepFaces is True the rolled faces are also kept, in
+    self.faces, as (die letter, side index) pairs.
+    A hand is a few dice, where a numpy call per die type costs more than the dice themselves,
+    so they're rolled one by one. Roll.batch() is for many hands.
+    """
+    __slots__ = ('pool', 'counts', 'faces', 'tally', 'description', 'breakdown')
+
+    def __init__(self, dice, keepFaces = False, rng = None) -> None:
+        """
+        dice is a dice expression str, a compiled PoolSpec, or a pool vector of how many of each die in DICE order.
+        rng is the DiceSource to roll with, the module's source if not given.
+        """
+        if rng == None:
+            rng = source
+        uniform = rng.random.random #Cheaper than randrange(), and as good for a handful of sides
+        self.pool = pool_vector(dice)
+        pool = self.pool.tolist()
+        counts = [0] * len(SYMBOLS)
+        faces = list() if keepFaces else None
+        for die, count in zip(DICE, pool):
+            if count == 0:
+                continue
+            sides = faceSymbols[die]
+            for _ in range(count):
+                side = int(uniform() * len(sides))
+                for symbol in sides[side]:
+                    counts[symbol] += 1
+                if keepFaces:
+                    faces.append((die, side))
+        self.counts = counts
+        self.faces = faces
         self.tally = Counter()
-        for letter in result:
-            self.tally[resultLookupName[letter]] += 1
-        self.success = self.tally['Success'] + self.tally['Triumph'] > self.tally['Failure'] + self.tally['Dispair']
-        self.threat = self.tally['Threat'] > self.tally['Advantage']
-        self.advantage = self.tally['Advantage'] > self.tally['Threat']
-        self.description = ''
-        self.description += f"{'SUCCEEDED' if self.success else 'FAILED'} "
-        if self.threat:
-            self.description += f"with {self.tally['Threat'] - self.tally['Advantage']} threat"
-        if self.advantage:
-            self.description += f"with {self.tally['Advantage'] - self.tally['Threat']} advantage"
-        self.breakdown = f"\nTriumph: {self.tally['Triumph']}, Success: {self.tally['Success']}, Advantage: {self.tally['Advantage']},\n" + \
-            f"Dispair: {self.tally['Dispair']}, Failure: {self.tally['Failure']}, Threat: {self.tally['Threat']}" 
-        if 'f' in dice:
-            self.breakdown += f"\nLightside: {self.tally['Lightside']}, Darkside: {self.tally['Darkside']}"
-
-def check_roll(skillDice: list, checkDice: str) -> Roll:
+        dict.update(self.tally, zip(SYMBOL_NAMES, counts)) #Counter's own update() goes the slow way round
+        s, a, x, t, f, d = counts[:6]
+        self.description = describe_net(s + x - f - d, a - t)
+        self.breakdown = breakdown(self.tally, pool[DICE.index('f')] > 0)
+
+    def count(self, letter: str) -> int:
+        return self.counts[SYMBOLS.index(letter)]
+
+    @property
+    def netSuccess(self) -> int:
+        """Triumphs count as successes and despairs as failures."""
+        return self.count('s') + self.count('x') - self.count('f') - self.count('d')
+
+    @property
+    def netAdvantage(self) -> int:
+        return self.count('a') - self.count('t')
+
+    @property
+    def success(self) -> bool:
+        return self.netSuccess > 0
+
+    @property
+    def threat(self) -> bool:
+        return self.netAdvantage < 0
+
+    @property
+    def advantage(self) -> bool:
+        return self.netAdvantage > 0
+
+    def histogram(self) -> np.ndarray:
+        """
+        Returns how many times each side was rolled, numbered as in faceOffsets. Only available if the faces were kept.
+        """
+        if self.faces == None:
+            raise AttributeError("Roll was made without keepFaces")
+        histogram = np.zeros(FACE_COUNT, dtype=np.int64)
+        for die, side in self.faces:
+            histogram[faceOffsets[die] + side] += 1
+        return histogram
+
+    @property
+    def string(self) -> str:
+        """
+        The rolled faces joined together. Only available if the faces were kept.
+        """
+        if self.faces == None:
+            raise AttributeError("Roll was made without keepFaces")
+        return ''.join(diceLookup[die].sides[side] for die, side in self.faces)
+
+    @classmethod
+    def batch(cls, dice, hands: int, rng = None) -> RollBatch:
+        """
+        Roll the same dice hands times with the batch engine instead of one Roll per hand.
+        """
+        return roll_pools(np.tile(pool_vector(dice), (hands, 1)), rng)
+
+def check_roll(skillDice: list, checkDice, rng = None, keepFaces = False) -> Roll:
     """
     Returns a roll using dice depending on the list give for a players skill in [pro, ability] form,
-    in combination with a str holding the rest of the dice to check against.
+    in combination with a dice expression str, or compiled PoolSpec, holding the rest of the dice to check against.
     """
-    hand = ''
-    hand += 'p' * skillDice[0]
-    hand += 'a' * skillDice[1]
-    hand += checkDice
-    roll = Roll(hand)
-    return roll
+    if isinstance(checkDice, str):
+        checkDice = compile_pool(checkDice)
+    return Roll(checkDice.resolve(skillDice), keepFaces, rng)
+
+#Dice that can be part of a check. Force dice are rolled on their own so they are left out of the odds.
+CHECK_DICE = DICE[:DICE.index('f')]
+
+def outcome_faces(die: str) -> np.ndarray:
+    """
+    Returns the faces of a die as an array of (netSuccess, netAdvantage, triumph, despair) rows.
+    Triumphs count as a success and despairs as a failure, same as Roll.
+    """
+    s, a, x, t, f, d = faceLookup[die][:, :6].T
+    return np.stack([s + x - f - d, a - t, x, d], axis=1)
+
+#The outcome faces of every check die, built once at import.
+outcomeLookup = {die : outcome_faces(die) for die in CHECK_DICE}
+
+class Distribution(object):
+    """
+    Exact joint distribution of a pool's outcomes. self.chances is a 4 dimensional array indexed by
+    [netSuccess - lowSuccess, netAdvantage - lowAdvantage, triumph, despair] holding the probability of each.
+    """
+    def __init__(self, chances: np.ndarray, lowSuccess: int, lowAdvantage: int) -> None:
+        self.chances = chances
+        self.lowSuccess = lowSuccess
+        self.lowAdvantage = lowAdvantage
+
+    def add_die(self, die: str) -> 'Distribution':
+        """
+        Returns a new Distribution for this pool with one more die, by convolving in each of its faces.
+        """
+        faces = outcomeLookup[die]
+        low = faces.min(axis=0)
+        spread = faces.max(axis=0) - low
+        chances = np.zeros(tuple(np.add(self.chances.shape, spread)))
+        weight = 1 / len(faces)
+        height, width, depth, breadth = self.chances.shape
+        for s, a, x, d in faces - low:
+            chances[s:s + height, a:a + width, x:x + depth, d:d + breadth] += self.chances * weight
+        return Distribution(chances, self.lowSuccess + int(low[0]), self.lowAdvantage + int(low[1]))
+
+    def axes(self) -> tuple:
+        """
+        Returns the netSuccess and netAdvantage value along each of the first two axes of self.chances.
+        """
+        success = np.arange(self.chances.shape[0]) + self.lowSuccess
+        advantage = np.arange(self.chances.shape[1]) + self.lowAdvantage
+        return success, advantage
+
+#Pools bigger than this many dice are estimated with Monte Carlo instead of solved exactly.
+EXACT_LIMIT = 24
+
+#Dice are folded into a distribution in this order, the ones a check is made against before the
+#   player's own, so every player's pool for the same check starts from the same cached pool.
+FOLD_ORDER = list(range(len(CHECK_DICE)))[::-1]
+#How many distributions are kept. Each pool's is kept, and so is the pool each die type finished on
+#   the way to it, so a bigger pool only has to fold in the dice past the biggest one already built.
+DISTRIBUTIONS = 512
+distributions = OrderedDict() #Pool counts to its Distribution, least recently used first
+distributionsLock = Lock()
+
+def distribution(counts: tuple) -> Distribution:
+    """
+    Exact joint distribution of (netSuccess, netAdvantage, triumph, despair) for a pool given
+    as a tuple of dice counts in CHECK_DICE order, of at most EXACT_LIMIT dice.
+
+    Built by convolving the dice in one at a time, in FOLD_ORDER, starting from the biggest pool
+    on the way there that's cached. A loop, not recursion, so it never goes deep.
+    """
+    counts = tuple(int(count) for count in counts)
+    if sum(counts) > EXACT_LIMIT:
+        raise DiceError(f"Can't work out exact odds for more than {EXACT_LIMIT} dice.")
+    #Every pool on the way to counts, as (column of the die just added, pool), empty pool first.
+    path = [(None, (0,) * len(counts))]
+    pool = [0] * len(counts)
+    for column in FOLD_ORDER:
+        for _ in range(counts[column]):
+            pool[column] += 1
+            path.append((column, tuple(pool)))
+    with distributionsLock:
+        start = len(path) - 1
+        while start > 0 and path[start][1] not in distributions:
+            start -= 1
+        result = distributions.get(path[start][1])
+        if result != None:
+            distributions.move_to_end(path[start][1])
+    if result == None:
+        result = Distribution(np.ones((1, 1, 1, 1)), 0, 0)
+    built = list()
+    for step in range(start + 1, len(path)):
+        column, pool = path[step]
+        result = result.add_die(CHECK_DICE[column])
+        #Only keep where each die type ends, and the pool asked for, not every pool in between.
+        if step == len(path) - 1 or path[step + 1][0] != column:
+            built.append((pool, result))
+    with distributionsLock:
+        for pool, each in built:
+            distributions[pool] = each
+            distributions.move_to_end(pool)
+        while len(distributions) > DISTRIBUTIONS:
+            distributions.popitem(last=False)
+    return result
+
+class Odds(object):
+    """
+    The exact outcome probabilities of a check pool, built from distribution().
+    """
+    def __init__(self, counts: tuple) -> None:
+        self.counts = counts
+        self.distribution = distribution(counts)
+        chances = self.distribution.chances
+        success, advantage = self.distribution.axes()
+        bySuccess = chances.sum(axis=(1, 2, 3))
+        byAdvantage = chances.sum(axis=(0, 2, 3))
+        self.success = float(bySuccess[success > 0].sum())
+        self.advantage = float(byAdvantage[advantage > 0].sum())
+        self.threat = float(byAdvantage[advantage < 0].sum())
+        self.triumph = float(chances[:, :, 1:, :].sum())
+        self.despair = float(chances[:, :, :, 1:].sum())
+        self.expectedSuccess = float(bySuccess @ success)
+        self.expectedAdvantage = float(byAdvantage @ advantage)
+
+    def summary(self) -> str:
+        return f"Success: {self.success:.1%}, Failure: {1 - self.success:.1%}\n" + \
+            f"Advantage: {self.advantage:.1%}, Threat: {self.threat:.1%}\n" + \
+            f"Triumph: {self.triumph:.1%}, Dispair: {self.despair:.1%}\n" + \
+            f"Average net success {self.expectedSuccess:+.2f}, advantage {self.expectedAdvantage:+.2f}"
+
+@lru_cache(maxsize=1024)
+def pool_odds(counts: tuple) -> Odds:
+    return Odds(counts)
 
-#TODO: Clean the mess outta these next two little guys... 
-def group_roll(groupDiceList: dict) -> str:
+def odds(pool) -> Odds:
+    """
+    Returns the exact Odds for a dice expression str of check dice, like 'ppadd', or a compiled PoolSpec or pool vector.
+    """
+    counts = pool_vector(pool)
+    if counts[DICE.index('f')] > 0:
+        raise DiceError("Force dice are not part of a check.")
+    return pool_odds(tuple(int(count) for count in counts[:len(CHECK_DICE)]))
+
+def check_odds(skillDice: list, checkDice) -> Odds:
+    """
+    Returns the exact Odds of a player with [pro, ability] skillDice making a check against checkDice,
+    a dice expression or compiled PoolSpec. Cached through pool_odds() on the final pool.
+    """
+    if isinstance(checkDice, str):
+        checkDice = compile_pool(checkDice)
+    return odds(checkDice.resolve(skillDice))
+
+#The outcomes estimated by Monte Carlo, the same ones Roll.description and Odds report.
+OUTCOMES = ['success', 'advantage', 'threat', 'triumph', 'despair']
+
+def sample_pool(pool: tuple, hands: int, seed: int) -> tuple:
+    """
+    Monte Carlo worker. Rolls the pool vector hands times with its own seeded Generator and returns
+    how many hands hit each of OUTCOMES, plus the sum of net success and of net advantage.
+    Lives at module level so a ProcessPoolExecutor can pickle it.
+    """
+    rolls = roll_pools(np.tile(np.array(pool, dtype=np.int64), (hands, 1)), DiceSource(seed))
+    netSuccess = rolls.netSuccess
+    netAdvantage = rolls.netAdvantage
+    hits = [netSuccess > 0, netAdvantage > 0, netAdvantage < 0, rolls.triumph > 0, rolls.despair > 0]
+    return [int(hit.sum()) for hit in hits], int(netSuccess.sum()), int(netAdvantage.sum())
+
+class Estimate(object):
+    """
+    A running Monte Carlo estimate of a pool's outcomes. Has the same outcome attributes as Odds,
+    plus the confidence interval half width of each in self.margins.
+    """
+    def __init__(self, hands: int, hits: list, netSuccess: int, netAdvantage: int, confidence: float) -> None:
+        self.hands = hands
+        self.confidence = confidence
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.margins = dict()
+        for name, count in zip(OUTCOMES, hits):
+            #Wilson score interval, which behaves near 0% and 100% unlike the normal approximation.
+            p = count / hands
+            centre = (p + z * z / (2 * hands)) / (1 + z * z / hands)
+            margin = z * ((p * (1 - p) / hands + z * z / (4 * hands * hands)) ** 0.5) / (1 + z * z / hands)
+            setattr(self, name, centre)
+            self.margins[name] = margin
+        self.expectedSuccess = netSuccess / hands
+        self.expectedAdvantage = netAdvantage / hands
+
+    @property
+    def precision(self) -> float:
+        """The widest margin of all the outcomes."""
+        return max(self.margins.values())
+
+    def summary(self) -> str:
+        m = self.margins
+        return f"Success: {self.success:.1%} ±{m['success']:.1%}\n" + \
+            f"Advantage: {self.advantage:.1%} ±{m['advantage']:.1%}, Threat: {self.threat:.1%} ±{m['threat']:.1%}\n" + \
+            f"Triumph: {self.triumph:.1%} ±{m['triumph']:.1%}, Dispair: {self.despair:.1%} ±{m['despair']:.1%}\n" + \
+            f"Average net success {self.expectedSuccess:+.2f}, advantage {self.expectedAdvantage:+.2f}\n" + \
+            f"({self.hands} rolls, {self.confidence:.0%} confidence)"
+
+def estimate(pool, precision = 0.005, confidence = 0.95, budget = 2.0, chunk = 20000):
+    """
+    Generator that estimates the outcomes of any pool of dice by rolling it in chunks spread
+    across the process pool, yielding an updated Estimate as each chunk comes in.
+    Stops once every outcome is known within precision, or after budget seconds.
+    """
+    counts = tuple(int(count) for count in pool_vector(pool))
+    workers = get_executor()
+    seeds = np.random.SeedSequence()
+    deadline = monotonic() + budget
+    running = set()
+    hands = 0
+    hits = [0] * len(OUTCOMES)
+    netSuccess = netAdvantage = 0
+    try:
+        while True:
+            #Keep two chunks queued per worker so none of them sit idle.
+            while len(running) < WORKERS * 2:
+                seed = int(seeds.spawn(1)[0].generate_state(1)[0])
+                running.add(workers.submit(sample_pool, counts, chunk, seed))
+            #Always wait for the first chunk, so there is at least one estimate to give.
+            timeout = max(deadline - monotonic(), 0) if hands > 0 else None
+            done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunkHits, chunkSuccess, chunkAdvantage = future.result()
+                hands += chunk
+                hits = [total + hit for total, hit in zip(hits, chunkHits)]
+                netSuccess += chunkSuccess
+                netAdvantage += chunkAdvantage
+            if hands > 0 and done:
+                result = Estimate(hands, hits, netSuccess, netAdvantage, confidence)
+                yield result
+                if result.precision <= precision:
+                    return
+            if hands > 0 and monotonic() >= deadline:
+                return
+    finally:
+        for future in running:
+            future.cancel()
+
+def group_pools(groupDiceList: dict, checkDice = '') -> np.ndarray:
+    """
+    Turn the results of Group.skill_dice_list() plus the dice expression, or compiled PoolSpec,
+    to check against into an array of pool vectors, one row per player, for roll_pools().
+    """
+    if isinstance(checkDice, str):
+        checkDice = compile_pool(checkDice)
+    skillDice = np.array(list(groupDiceList.values()), dtype=np.int64).reshape(-1, 2)
+    return checkDice.resolve(skillDice)
+
+class GroupCheck(object):
+    """
+    The structured result of rolling every player's hand for a skill in one batch.
+    self.names lines up with the rows of self.rolls, a RollBatch, and self.checked
+    is whether there were dice to check against or it was a plain roll, like for initiative.
+    """
+    def __init__(self, names: list, rolls: RollBatch, checked: bool) -> None:
+        self.names = names
+        self.rolls = rolls
+        self.checked = checked
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def passed(self) -> np.ndarray:
+        return self.rolls.netSuccess > 0
+
+    def table(self) -> list:
+        """
+        Returns a row per player as a dict of the player's name and their count of each outcome.
+        """
+        columns = {'success' : self.rolls.success, 'advantage' : self.rolls.advantage, 'triumph' : self.rolls.triumph,
+            'threat' : self.rolls.threat, 'failure' : self.rolls.failure, 'despair' : self.rolls.despair,
+            'netSuccess' : self.rolls.netSuccess, 'netAdvantage' : self.rolls.netAdvantage}
+        columns = {key : column.tolist() for key, column in columns.items()}
+        return [dict({'name' : name}, **{key : column[row] for key, column in columns.items()})
+            for row, name in enumerate(self.names)]
+
+def group_check(groupDiceList: dict, checkDice = None, rng = None, keepFaces = False) -> GroupCheck:
+    """
+    Is given the results of Group.skill_dice_list(), a dict of player names to [pro, ability], and
+    rolls every player's hand, plus the dice to check against if any, in a single batch.
+    """
+    checked = checkDice != None
+    rolls = roll_pools(group_pools(groupDiceList, checkDice if checked else ''), rng, keepFaces)
+    return GroupCheck(list(groupDiceList.keys()), rolls, checked)
+
+def format_group_check(result: GroupCheck):
+    """
+    Generator that yields one formatted line per player of a GroupCheck, so long tables can be
+    sent on as they're made. Checks show if each player passed, plain rolls show their symbols.
+    """
+    if result.checked:
+        netSuccess = result.rolls.netSuccess.tolist()
+        netAdvantage = result.rolls.netAdvantage.tolist()
+        for row, name in enumerate(result.names):
+            yield f"{name}: {describe_net(netSuccess[row], netAdvantage[row])}\n"
+    else:
+        triumph = result.rolls.triumph.tolist()
+        success = result.rolls.success.tolist()
+        advantage = result.rolls.advantage.tolist()
+        for row, name in enumerate(result.names):
+            yield f"T: {triumph[row]} | S: {success[row]} | A: {advantage[row]} ({name})\n"
+
+def group_roll(groupDiceList: dict, rng = None) -> str:
     """
     This function is given the results of Player.Group.skill_dice_list(). Which is a dict of player names to a specific skill, [pro, ability].
     It rolls the amount of dice each player has in that skill and returns a formatted string with the results.
     """
-    rolls = dict()
-    for player in groupDiceList:
-        hand = ''
-        hand += 'p' * groupDiceList[player][0]
-        hand += 'a' * groupDiceList[player][1]
-        rolls[player] = Roll(hand)
-    result = str()
-    for name in rolls: 
-        result += f"T: {rolls[name].tally['Triumph']} | S: {rolls[name].tally['Success']} | A: {rolls[name].tally['Advantage']} ({name})\n"
-    return result
+    return ''.join(format_group_check(group_check(groupDiceList, rng=rng)))
 
-def group_check_roll(groupDiceList: dict, checkDice: str) -> str:
-    rolls = dict()
-    for player in groupDiceList:
-        hand = checkDice
-        for x in range(groupDiceList[player][0]):
-            hand += 'p'
-        for x in range(groupDiceList[player][1]):
-            hand += 'a'
-        rolls[player] = Roll(hand)
-    result = str()
-    for name in rolls: 
-        result += f"{name}: {rolls[name].description}\n"
-    return result
\ No newline at end of file
+def group_check_roll(groupDiceList: dict, checkDice, rng = None) -> str:
+    return ''.join(format_group_check(group_check(groupDiceList, checkDice, rng)))
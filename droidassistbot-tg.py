@@ -13,9 +13,16 @@ from telegram.ext import Updater
 from telegram.ext import CommandHandler
 import logging
 
-from player import PlayerError, PlayerCharacter
+from player import PlayerError, PlayerCharacter, load_sheets, read_sheet, STATS
 from group import Group
-from dice import (group_roll, check_roll, group_check_roll, Roll, diceLookup)
+from history import RollLog
+from saveworker import SaveWorker
+from sheetwatch import SheetWatcher
+from sheetcache import file_hash
+from sessions import SessionRegistry
+from store import open_backend
+from dice import (group_check, format_group_check, check_roll, Roll, odds, estimate, EXACT_LIMIT,
+    chat_source, seed_chat, compile_pool, DiceError)
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                      level=logging.INFO)
@@ -27,38 +34,133 @@ if CHARFOLDER == None:
     CHARFOLDER = Path('characters/')
 else:
     CHARFOLDER = Path(CHARFOLDER)
-
-updater = Updater(TOKEN, use_context=True)
-dispatcher = updater.dispatcher
+HISTORYFOLDER = os.getenv("ROLL-HISTORY")
+if HISTORYFOLDER == None:
+    HISTORYFOLDER = Path('history/')
+else:
+    HISTORYFOLDER = Path(HISTORYFOLDER)
+
+#Where characters are kept day to day: 'pdf' works straight from the sheets, 'sqlite' or 'json'
+#   keep them in CHARFOLDER and only touch the PDFs on /importpdf and /exportpdf.
+SHEETBACKEND = os.getenv("SHEET-BACKEND")
+if SHEETBACKEND == None:
+    SHEETBACKEND = 'pdf'
+#Set to anything to reload sheets as they're changed on disk.
+WATCHSHEETS = os.getenv("WATCH-SHEETS") != None
+#Unsaved changes are journaled here, and replayed if the bot stops before saving them.
+JOURNALFOLDER = os.getenv("CHANGE-JOURNAL")
+if JOURNALFOLDER == None:
+    JOURNALFOLDER = Path('journal/')
+else:
+    JOURNALFOLDER = Path(JOURNALFOLDER)
+#Each chat's table is kept here once it's been idle long enough to be pushed out of memory.
+SESSIONFOLDER = os.getenv("SESSION-FOLDER")
+if SESSIONFOLDER == None:
+    SESSIONFOLDER = Path('sessions/')
+else:
+    SESSIONFOLDER = Path(SESSIONFOLDER)
+#How many players, across every chat, to keep in memory at once.
+SESSIONBUDGET = os.getenv("SESSION-BUDGET")
+if SESSIONBUDGET == None:
+    SESSIONBUDGET = 64
+else:
+    SESSIONBUDGET = int(SESSIONBUDGET)
+SAVEDELAY = os.getenv("SAVE-DELAY")
+if SAVEDELAY == None:
+    SAVEDELAY = 5.0
+else:
+    SAVEDELAY = float(SAVEDELAY)
+
+def close_players(group: Group) -> None:
+    """
+    Save a group's unsaved changes and close their journals, as it's stopped or evicted.
+    """
+    players = group.get_players()
+    saver.flush(players)
+    for player in players:
+        player.journal.close()
+
+def restore_players(group: Group) -> None:
+    """
+    Reopen the journals of a group rebuilt from its snapshot.
+    """
+    for player in group.get_players():
+        open_journal(player)
+
+def chat_group(update) -> Group:
+    """The Group of the chat a command came from."""
+    return sessions.get(update.effective_chat.id)
+
+def sheet_changed(file: Path) -> None:
+    """
+    Called from the SheetWatcher's thread when a sheet in CHARFOLDER changes. Parses it, which for
+    a new sheet also readies the cache for /load, and swaps the new stats into the loaded player.
+    Our own saves, and players with changes not saved yet, are left alone.
+    """
+    player = None
+    for group in sessions.groups():
+        for each in group.get_players():
+            if Path(each.fileName).resolve() == file.resolve():
+                player = each
+    if player != None and player.is_dirty:
+        logging.info(f"{file} changed but {player.name} has unsaved changes, not reloading")
+        return
+    try:
+        if player != None and player.writtenHash == file_hash(file):
+            return
+        data = read_sheet(file)
+    except (PlayerError, OSError) as err:
+        logging.warning(f"Couldn't reload {file}: {err}")
+        return
+    if player == None:
+        return
+    if data['name'] != player.name:
+        logging.warning(f"{file} is now {data['name']}'s sheet, /unload {player.name} and /load it")
+        return
+    if player.replace_data(data):
+        if player.backend != None: #Keep the backend in step with the sheet
+            player.save()
+        logging.info(f"Reloaded {player.name} from {file}")
+    else:
+        logging.info(f"{file} changed but {player.name} has unsaved changes, not reloading")
 
 commandDescriptions = {
     "stat" : "Usage '/stat [player] [stat] ([stat]...)\nLookup the current value of a certain stat or multiple stats. Characteristics, abilites, dynamics, and general like credits or duty.",
     "stat" : "Usage '/stat [stat]\nLookup the current value of a certain stat for the whole group. Characteristics, abilites, dynamics, and general like credits or duty.",
     "initroll" : "Usage: '/initroll [stat]'\nAutomatically rolls the dice for each loaded player and list the results.",
     "highest" : "Usage: '/highest [stat]'\nFind the player with the higest stat in a given skill or characteristic.",
+    "top" : "Usage: '/top [stat] (n)'\nList the n players, 5 if not given, highest in a stat. Tied players share a rank.",
+    "rank" : "Usage: '/rank [player] [stat]'\nShow where a player ranks in a stat among the loaded players, and who they're tied with.",
+    "best" : f"Usage: '/best [skill] [dice]'\nRank the loaded players by their chance to pass a check of the given skill against the dice, with their expected advantage. Pools, skill dice included, can be at most {EXACT_LIMIT} dice.",
     "sitrep" : "Usage: '/sitrep'\nList the medical and dynamic stats for each player. Current and threshold.",
-    "roll" : "Usage: '/roll [dice]'\nPerform a dice roll and show the results. Dice are the first letter of each dice's name. For ex. 'd' for difficulty dice.",
+    "roll" : "Usage: '/roll [dice]'\nPerform a dice roll and show the results. Dice are the first letter of each dice's name. For ex. 'd' for difficulty dice. Counts and names work too, like '3p2a+2d1c +boost', as do 'upgrade [n]', 'downgrade [n]' and 'upgrade difficulty [n]'.",
+    "odds" : f"Usage: '/odds [dice]'\nShow the exact chances of success, advantage, triumph and dispair for a pool of dice. Dice are the first letter of each dice's name, force dice not included. Pools over {EXACT_LIMIT} dice are estimated instead.",
+    "rollstats" : "Usage: '/rollstats (player)'\nShows the roll statistics for this chat, and if the dice look fair. Given a player, or someone's first name for /roll, shows just theirs.",
+    "seed" : "Usage: '/seed (number)'\nShows the seed this chat's dice are rolling from, so the session's rolls can be replayed. Given a number, starts rolling over from that seed instead.",
     "check" : "Usage: '/check [player] [skill] [dice]'\nPerform a dice check by automatically looking up the dice for a given player's given skill. Add the dice to check against at the end. Dice are the first letter of each dice's name. For ex. 'd' for difficulty dice.",
     "checkall" : "Usage: /checkall [skill] [dice]'\nPerform a check for all players given skill versus the supplied dice. Dice are the first letter of each dice's name. For ex. 'd' for difficulty dice.",
     "players" : "Usage: '/players'\nList all the currently loaded players.",
-    "start" : "Usage: '/start'\nPrepares a new group for a new session. Clears any loaded players if any.",
-    "stop" : "Usage: '/stop'\nClears the group and unloads any loaded players.",
-    "load" : "Usage: '/load [file]'\nLoads a player from PDF file named [file].",
-    "loadall" : "Usage '/loadall'\nScans the set player sheet folder for PDFs and attempt to load them all into the group.",
+    "start" : "Usage: '/start'\nPrepares a new group for a new session in this chat. Clears any loaded players if any. Each chat has its own group.",
+    "stop" : "Usage: '/stop'\nSaves any unsaved changes, then clears this chat's group and unloads any loaded players.",
+    "load" : "Usage: '/load [file]'\nLoads a player from PDF file named [file]. With a sheet backend set, give the player's name instead.",
+    "loadall" : "Usage '/loadall'\nScans the set player sheet folder for PDFs and attempt to load them all into the group. With a sheet backend set, loads everyone saved in it.",
     "update" : "Usage '/update [name]'\nReloads the player matching the given name. Attemps to load the same file from before once again.",
     "modify" : "Usage '/modify [stat] [modifier]\n Modify every loaded player's stat by provided value, a positive or negative number",
     "modifyall" : "Usage '/modify [name] [stat] [modifier]\n Modify player's stat by provided value, a positive or negative number",
-    "changelog" : "Usage '/changelog [name]\nShows the log of unsaved changes made to that player. Starting from most recent on.",
+    "apply" : "Usage '/apply [changes] [@player]... (; [changes] [@player]...)'\nMake many changes at once, like '/apply wounds+3 strain-2 @kira @vex; credits+500 @all'. Nothing is changed if any of it is wrong.",
+    "changelog" : "Usage '/changelog [name] ([name]...) (page)'\nShows the log of unsaved changes made to that player. Starting from most recent on, a page at a time.",
     "talent" : "Usage '/talent [name] (selection #, or 'all')'\nIf only the name is given it lists the talents for specified player by number. Otherwise grabs the details of the selected talent by number, or shows them 'all' in detail.",
-    "destiny" : "Usage '/destiny [arg] (arg2)\nPossible arguments combos: 'list', shows current destiny pool. 'set', followed by a string of 'l' and 'd' for each respective token, will manually set the force dice pool. 'roll', will clear the pool and roll for a new one, one dice per loaded player in the group. 'use light', or 'use dark' use of the tokens if available.",
-    "save" : "Usage '/save [player name]'\nSave the selected player to pdf. Uses the set character folder, or defaults to 'characters/'. Saves the old file as '[player name].bkp'",
-    "saveall" : "Usage '/saveall'\nPerforms /save on every loaded player in the group."
+    "destiny" : "Usage '/destiny [arg] (arg2)\nPossible arguments combos: 'list', shows current destiny pool. 'set', followed by a string of 'l' and 'd' for each respective token, will manually set the force dice pool. 'roll', will clear the pool and roll for a new one, one dice per loaded player in the group. 'use light', or 'use dark' use of the tokens if available. 'undo' takes back the last token used. 'stats' shows how destiny has gone this session.",
+    "save" : "Usage '/save [player name]'\nSave the selected player to pdf. Uses the set character folder, or defaults to 'characters/'. Saves the old file as '[player name].bkp'. With a sheet backend set, saves there instead.",
+    "importpdf" : "Usage '/importpdf [file] ([file]...)'\nRead PDF sheets from the character folder into the sheet backend, ready for /load.",
+    "exportpdf" : "Usage '/exportpdf (player name)...'\nWrite the selected players, or every loaded player, back to their PDF sheets.",
+    "saveall" : "Usage '/saveall'\nPerforms /save on every loaded player in the group that has unsaved changes. Changes are also saved automatically a few seconds after the last one."
 }
 
 def error_callback(update, context):
     try:
         raise context.error
-    except PlayerError as error:
+    except (PlayerError, DiceError) as error:
         context.bot.send_message(chat_id=update.effective_chat.id, text=str(error))
     except KeyError as error:
         if error.args[0] == 'group':
@@ -72,59 +174,126 @@ def arg_check(context, args: int) -> None:
     if len(context.args) < args:
         raise PlayerError(f"Error: Expected at least {args} arguments")
 
+#Telegram won't take a message longer than this.
+MESSAGE_LIMIT = 4096
+
+def send_lines(update, context, message: str, lines) -> None:
+    """
+    Send message followed by the lines from a generator, starting a new message whenever the next
+    line would go over Telegram's limit, instead of building the whole text first.
+    """
+    for line in lines:
+        if len(message) + len(line) > MESSAGE_LIMIT:
+            context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+            message = str()
+        message += line
+    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+
+def check_pool(args: list):
+    """Compile the dice expression spread over args for a check, which can't use force dice."""
+    pool = compile_pool(' '.join(args))
+    if pool.count('f') > 0:
+        raise PlayerError("Force dice can't be used in a check.")
+    return pool
+
+def skill_and_dice(args: list) -> tuple:
+    """
+    Split args into the skill, which can be more than one word like 'ranged light', and the
+    compiled dice expression after it to check against.
+    """
+    skill = STATS.split(args)[0]
+    dice = args[len(skill.split()):]
+    if len(dice) == 0:
+        raise PlayerError(f"Give the dice to check {skill} against after it.")
+    return skill, check_pool(dice)
+
+def open_journal(player: PlayerCharacter) -> str:
+    """
+    Start journaling a newly loaded player's changes, and queue a save if any were replayed.
+    Returns a note about the replay for the load message, if there was one.
+    """
+    replayed = player.open_journal(JOURNALFOLDER)
+    if replayed == 0:
+        return str()
+    saver.mark(player)
+    return f" ({replayed} unsaved changes recovered)"
+
 def start(update, context) -> None:
-    context.bot_data['group'] = Group()
+    sessions.start(update.effective_chat.id)
     context.bot.send_message(chat_id=update.effective_chat.id, text="New mayo jar opened...")
 
 def stop(update, context) -> None:
-    context.bot_data.clear()
+    group = sessions.stop(update.effective_chat.id)
+    if group != None:
+        close_players(group)
     context.bot.send_message(chat_id=update.effective_chat.id, text="Mayo jar closed...")
 
 def load_player(update, context) -> None:
     arg_check(context, 1)
     for file in context.args:
         try: #Do this inside the loop so that if we fail we can continue to try loading other players.
-            file = CHARFOLDER / file
-            newPlayer = PlayerCharacter(file)
-            context.bot_data['group'].add_player(newPlayer)
-            context.bot.send_message(chat_id=update.effective_chat.id, text=f"Loaded player {newPlayer.name}")
+            if backend != None:
+                newPlayer = backend.load(file)
+            else:
+                newPlayer = PlayerCharacter(CHARFOLDER / file)
+            sessions.add_player(update.effective_chat.id, newPlayer)
+            recovered = open_journal(newPlayer)
+            context.bot.send_message(chat_id=update.effective_chat.id, text=f"Loaded player {newPlayer.name}{recovered}")
         except PlayerError as err:
             context.bot.send_message(chat_id=update.effective_chat.id, text=str(err))
 
 def load_all(update, context) -> None:
-    for file in CHARFOLDER.glob("*.pdf"):
+    chat_group(update) #So a chat with no group hears about it before any sheets are parsed
+    loaded = list()
+    errors = list()
+    if backend != None:
+        results = dict()
+        for name in backend.names():
+            try:
+                results[name] = backend.load(name)
+            except PlayerError as err:
+                results[name] = err
+    else:
+        results = load_sheets(list(CHARFOLDER.glob("*.pdf")))
+    for file, result in sorted(results.items()):
         try:
-            newPlayer = PlayerCharacter(file)
-            context.bot_data['group'].add_player(newPlayer)
-            context.bot.send_message(chat_id=update.effective_chat.id, text=f"Loaded player {newPlayer.name} from {file}...")
+            if isinstance(result, PlayerError):
+                raise result
+            sessions.add_player(update.effective_chat.id, result)
+            loaded.append(f"{result.name} from {file}{open_journal(result)}")
         except PlayerError as err:
-            context.bot.send_message(chat_id=update.effective_chat.id, text=str(err))
+            errors.append(str(err))
+    message = f"Loaded {len(loaded)} players:\n" + '\n'.join(loaded)
+    if errors:
+        message += f"\n\n{len(errors)} failed:\n" + '\n'.join(errors)
+    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
 
 def unload_player(update, context) -> None:
     arg_check(context, 1)
-    context.bot_data['group'].remove_player(context.args[0])
+    saver.flush([chat_group(update).get_player(context.args[0])])
+    chat_group(update).remove_player(context.args[0])
     context.bot.send_message(chat_id=update.effective_chat.id, text=f"Unloaded player {context.args[0]}")
 
 def update_player(update, context) -> None:
     arg_check(context, 1)
-    context.bot_data['group'].get_player(context.args[0]).update() #TODO Add new file argument
+    chat_group(update).get_player(context.args[0]).update() #TODO Add new file argument
     context.bot.send_message(chat_id=update.effective_chat.id, text=f"Updated player {context.args[0]}")
 
-    playerList = context.bot_data['group'].get_loaded_players()
+    playerList = chat_group(update).get_loaded_players()
     message = 'Players currently loaded: ' + ', '.join(playerList)
     context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
 def list_players(update, context) -> None:
-    playerList = context.bot_data['group'].get_loaded_players()
+    playerList = chat_group(update).get_loaded_players()
     message = f"{len(playerList)} Players currently loaded: " + ', '.join(playerList)
     context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
 def stat(update, context) -> None:
     arg_check(context, 2)
     playerName = context.args.pop(0)
-    player = context.bot_data['group'].get_player(playerName)
-    for arg in context.args:
+    player = chat_group(update).get_player(playerName)
+    for arg in STATS.split(context.args): #So 'ranged light' is one stat, not two
         try: #Try locally so we can fail each lookup seperately instead of blowing the whole command
             result = player.lookup_stat(arg)
             context.bot.send_message(chat_id=update.effective_chat.id, text=result)
@@ -133,18 +302,39 @@ def stat(update, context) -> None:
 
 def highest_stat(update, context) -> None:
     arg_check(context, 1)
-    result = context.bot_data['group'].find_highest_stat(context.args[0])
+    result = chat_group(update).find_highest_stat(' '.join(context.args))
+    context.bot.send_message(chat_id=update.effective_chat.id, text=result)
+
+def top_stat(update, context) -> None:
+    arg_check(context, 1)
+    n = 5
+    stat = context.args
+    if len(context.args) > 1 and context.args[-1].isdigit():
+        n = int(context.args[-1])
+        stat = context.args[:-1]
+    result = chat_group(update).top_stat(' '.join(stat), n)
+    context.bot.send_message(chat_id=update.effective_chat.id, text=result)
+
+def rank(update, context) -> None:
+    arg_check(context, 2)
+    result = chat_group(update).rank_of(context.args[0], ' '.join(context.args[1:]))
+    context.bot.send_message(chat_id=update.effective_chat.id, text=result)
+
+def best_for_check(update, context) -> None:
+    arg_check(context, 2)
+    skill, dice = skill_and_dice(context.args)
+    result = chat_group(update).best_for_check(skill, dice)
     context.bot.send_message(chat_id=update.effective_chat.id, text=result)
 
 def situation_report(update, context) -> None:
     if len(context.args) == 0:
-        results =  context.bot_data['group'].sit_rep()
+        results =  chat_group(update).sit_rep()
         for result in results:
             context.bot.send_message(chat_id=update.effective_chat.id, text=result)
     else:
         for playerName in context.args:
             try: #Try locally so we can fail each lookup seperately instead of blowing the whole command
-                player = context.bot_data['group'].get_player(playerName)
+                player = chat_group(update).get_player(playerName)
                 result = player.sit_rep()
                 context.bot.send_message(chat_id=update.effective_chat.id, text=result)
             except PlayerError as err:
@@ -152,56 +342,85 @@ def situation_report(update, context) -> None:
             
 def roll_dice(update, context) -> None:
     arg_check(context, 1)
-    dice = context.args[0].lower()
-    for die in dice:
-        if die not in diceLookup.keys():
-            raise PlayerError(f"Dice {die!r} not recognized.")
+    dice = compile_pool(' '.join(context.args))
     message = f"{update.effective_user.first_name}'s roll results:\n"
-    results = Roll(dice)
+    results = Roll(dice, True, chat_source(update.effective_chat.id))
+    rollLog.record_roll(update.effective_chat.id, update.effective_user.first_name.lower(), results)
     message += results.description + results.breakdown
     #TODO: Other features to grab here. How to handle success or failure.
     context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
+def roll_odds(update, context) -> None:
+    arg_check(context, 1)
+    dice = check_pool(context.args)
+    message = f"Odds for {' '.join(context.args)}:\n"
+    if dice.resolve().sum() > EXACT_LIMIT:
+        for result in estimate(dice): #Run it out to the latest estimate
+            pass
+        message += result.summary()
+    else:
+        message += odds(dice).summary()
+    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+
+def seed(update, context) -> None:
+    if len(context.args) == 0:
+        source = chat_source(update.effective_chat.id)
+    else:
+        try:
+            source = seed_chat(update.effective_chat.id, int(context.args[0]))
+        except ValueError:
+            raise PlayerError(f"Seed {context.args[0]!r} is not a number.")
+    context.bot.send_message(chat_id=update.effective_chat.id, text=f"Dice are rolling from seed {source.seed}")
+
+def roll_stats(update, context) -> None:
+    if len(context.args) == 0:
+        stats = rollLog.session_stats(update.effective_chat.id)
+        message = "Roll statistics this session:\n" + stats.summary()
+        message += "\nFairness by die:\n" + (stats.fairness_report() or "No dice rolled yet.")
+    else:
+        name = context.args[0].lower()
+        stats = rollLog.player_stats(update.effective_chat.id, name)
+        message = f"{name}'s roll statistics:\n" + stats.summary()
+    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+
 def init_roll(update, context) -> None:
     arg_check(context, 1)
-    dice = context.bot_data['group'].skill_dice_list(context.args[0])
-    result = f"Rolling {context.args[0].lower()} for {len(dice)} players...\n\n"
-    result += group_roll(dice)
-    context.bot.send_message(chat_id=update.effective_chat.id, text=result)
+    skill = ' '.join(context.args)
+    dice = chat_group(update).skill_dice_list(skill)
+    result = group_check(dice, rng=chat_source(update.effective_chat.id), keepFaces=True)
+    rollLog.record_group(update.effective_chat.id, result)
+    message = f"Rolling {skill.lower()} for {len(dice)} players...\n\n"
+    send_lines(update, context, message, format_group_check(result))
 
 def stat_all(update, context) -> None:
     arg_check(context, 1)
     #This feels out of order, but this order allows us to fail before we do move memory around.
-    stat = context.args[0]
-    stats = context.bot_data['group'].stat_list(stat)
+    stat = ' '.join(context.args)
+    stats = chat_group(update).stat_list(stat)
     result = f"Looking up {stat} for the whole group...\n"
     result += stats
     context.bot.send_message(chat_id=update.effective_chat.id, text=result)
 
 def check(update, context) -> None:
     arg_check(context, 3)
-    player = context.bot_data['group'].get_player(context.args[0])
-    playerDice = player.skill_dice(context.args[1])
-    dice = context.args[2].lower()
-    for die in dice:
-        if die not in 'pabcds':
-            raise PlayerError(f"Dice {die!r} not recognized.")
+    player = chat_group(update).get_player(context.args[0])
+    skill, dice = skill_and_dice(context.args[1:])
+    playerDice = player.skill_dice(skill)
     message = f"{player.name}'s check results:\n"
-    results = check_roll(playerDice, dice)
+    results = check_roll(playerDice, dice, chat_source(update.effective_chat.id), True)
+    rollLog.record_roll(update.effective_chat.id, player.name, results)
     message += results.description + results.breakdown
     #TODO: Other features to grab here. How to handle success or failure.
     context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
 def check_all(update, context) -> None:
     arg_check(context, 2)
-    checkDice = context.args[1].lower()
-    for die in checkDice:
-        if die not in 'pabcds':
-            raise PlayerError(f"Dice {die!r} not recognized.")
-    skillDice = context.bot_data['group'].skill_dice_list(context.args[0])
-    result = f"Making check for {len(skillDice)} players...\n\n"
-    result += group_check_roll(skillDice, checkDice)
-    context.bot.send_message(chat_id=update.effective_chat.id, text=result)
+    skill, checkDice = skill_and_dice(context.args)
+    skillDice = chat_group(update).skill_dice_list(skill)
+    result = group_check(skillDice, checkDice, chat_source(update.effective_chat.id), True)
+    rollLog.record_group(update.effective_chat.id, result)
+    message = f"Making check for {len(skillDice)} players...\n\n"
+    send_lines(update, context, message, format_group_check(result))
 
 def help_command(update, context) -> None:
     message = ""
@@ -218,28 +437,41 @@ def help_command(update, context) -> None:
 
 def modify(update, context) -> None:
     arg_check(context, 3)
-    player = context.bot_data['group'].get_player(context.args[0])
-    result = player.change(context.args[1], int(context.args[2]))
+    player = chat_group(update).get_player(context.args[0])
+    result = player.change(' '.join(context.args[1:-1]), int(context.args[-1]))
+    saver.mark(player)
     context.bot.send_message(chat_id=update.effective_chat.id, text=result)
 
 def modify_all(update, context) -> None:
     arg_check(context, 2)
-    result = context.bot_data['group'].change_all(context.args[0], int(context.args[1]))
+    result = chat_group(update).change_all(' '.join(context.args[:-1]), int(context.args[-1]))
+    saver.mark(*chat_group(update).get_players())
+    context.bot.send_message(chat_id=update.effective_chat.id, text=result)
+
+def apply_changes(update, context) -> None:
+    arg_check(context, 2)
+    group = chat_group(update)
+    result = group.apply_changes(' '.join(context.args))
+    saver.mark(*[player for player in group.get_players() if player.is_dirty])
     context.bot.send_message(chat_id=update.effective_chat.id, text=result)
 
 def changelog(update, context) -> None:
-    if len(context.args) >= 1:
-        for each in context.args:
-            player = context.bot_data['group'].get_player(each)
-            message = f"{player.name}'s changelog this session:\n\n"
-            for line in player.changeLog:
-                message += f"{line}\n"
-            context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+    arg_check(context, 1)
+    names = context.args
+    page = 1
+    if len(names) > 1 and names[-1].isdigit():
+        page = int(names[-1])
+        names = names[:-1]
+    for each in names:
+        player = chat_group(update).get_player(each)
+        message = f"{player.name}'s changelog this session:\n\n"
+        message += player.get_changelog(page)
+        context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
 def talent(update, context) -> None:
     arg_check(context, 1)
     playerName = context.args.pop(0)
-    player = context.bot_data['group'].get_player(playerName)
+    player = chat_group(update).get_player(playerName)
     if len(context.args) == 0: #None selected so grab just the names of them all.
         message = player.get_talents()
     elif context.args[0] == 'all': #They want all the details so give a detailed list.
@@ -250,34 +482,40 @@ def talent(update, context) -> None:
 
 def destiny(update, context) -> None:
     arg_check(context, 1)
+    group = chat_group(update)
+    pool = group.destiny
     if context.args[0].lower() == 'roll':
-        playerList = context.bot_data['group'].get_loaded_players()
+        playerList = group.get_loaded_players()
         playerCount = len(playerList)
         dice = 'f' * playerCount
-        roll = Roll(dice)
-        context.bot_data['group'].destiny.clear()
-        context.bot_data['group'].destiny.addLight(roll.tally['Lightside'])
-        context.bot_data['group'].destiny.addDark(roll.tally['Darkside'])
+        roll = Roll(dice, rng=chat_source(update.effective_chat.id))
+        pool.roll(roll.tally['Lightside'], roll.tally['Darkside'])
         message = f"Rolled force die for {playerCount} players:\n"
-        message += context.bot_data['group'].destiny.getPoolDesc()
+        message += pool.getPoolDesc()
         context.bot.send_message(chat_id=update.effective_chat.id, text=message)
     elif context.args[0].lower() == 'list':
-        message = context.bot_data['group'].destiny.getPoolDesc()
-        #TODO: Show tokens used
+        message = pool.getPoolDesc()
+        message += f"\nUsed {pool.lightUsed} light and {pool.darkUsed} dark since the pool was rolled or set."
         context.bot.send_message(chat_id=update.effective_chat.id, text=message)
     elif context.args[0].lower() == 'use':
         arg_check(context, 2)
         if context.args[1].lower() == 'light':
-            message = context.bot_data['group'].destiny.useLightside()
+            message = pool.useLightside()
             context.bot.send_message(chat_id=update.effective_chat.id, text=message)
         if context.args[1].lower() == 'dark':
-            message = context.bot_data['group'].destiny.useDarkside()
+            message = pool.useDarkside()
             context.bot.send_message(chat_id=update.effective_chat.id, text=message)
     elif context.args[0].lower() == 'set':
         arg_check(context, 2)
-        context.bot_data['group'].destiny.define(context.args[1])
+        pool.define(context.args[1])
         message = "Changed force dice pool...\n"
-        message += context.bot_data['group'].destiny.getPoolDesc()
+        message += pool.getPoolDesc()
+        context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+    elif context.args[0].lower() == 'undo':
+        message = pool.undo()
+        context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+    elif context.args[0].lower() == 'stats':
+        message = pool.get_stats()
         context.bot.send_message(chat_id=update.effective_chat.id, text=message)
     else:
         context.bot.send_message(chat_id=update.effective_chat.id, text="Unknown argument. See /help destiny")
@@ -285,22 +523,53 @@ def destiny(update, context) -> None:
 def save(update, context) -> None:
     arg_check(context, 1)
     playerName = context.args[0].lower()
-    player = context.bot_data['group'].get_player(playerName)
+    player = chat_group(update).get_player(playerName)
     outFile = player.save()
     context.bot.send_message(chat_id=update.effective_chat.id, text=f"Saved file '{outFile}'")
 
+def import_pdf(update, context) -> None:
+    arg_check(context, 1)
+    if backend == None:
+        raise PlayerError("No sheet backend set. Set SHEET-BACKEND to 'sqlite' or 'json' to use one.")
+    message = str()
+    for file in context.args:
+        try:
+            player = backend.import_pdf(CHARFOLDER / file)
+            message += f"Imported {player.name} from {file}\n"
+        except PlayerError as err:
+            message += f"{err}\n"
+    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+
+def export_pdf(update, context) -> None:
+    group = chat_group(update)
+    playerNames = context.args if len(context.args) > 0 else group.get_loaded_players()
+    message = 'Exported to the following files:\n'
+    for name in playerNames:
+        try:
+            message += group.get_player(name).export_pdf()
+            message += '\n'
+        except PlayerError as err:
+            context.bot.send_message(chat_id=update.effective_chat.id, text=str(err))
+    context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+
 def save_all(update, context) -> None:
-    playerNames = context.bot_data['group'].get_loaded_players()
+    playerNames = chat_group(update).get_loaded_players()
     message = 'Saved to the following files:\n'
+    skipped = list()
     for name in playerNames:
         try:
-            player = context.bot_data['group'].get_player(name)
+            player = chat_group(update).get_player(name)
+            if not player.is_dirty:
+                skipped.append(name)
+                continue
             result = player.save()
             message += result
             message += '\n'
         except PlayerError as err:
                 context.bot.send_message(chat_id=update.effective_chat.id, text=str(err))
 
+    if skipped:
+        message += f"\nNo unsaved changes: {', '.join(skipped)}"
     context.bot.send_message(chat_id=update.effective_chat.id, text=message)
 
 load_handler = CommandHandler('load', load_player)
@@ -312,8 +581,14 @@ stat_handler = CommandHandler('stat', stat)
 start_handler = CommandHandler('start', start)
 stop_handler = CommandHandler('stop', stop)
 highest_handler = CommandHandler('highest', highest_stat)
+top_handler = CommandHandler('top', top_stat)
+rank_handler = CommandHandler('rank', rank)
+best_handler = CommandHandler('best', best_for_check)
 sitrep_handler = CommandHandler('sitrep', situation_report)
 roll_handler = CommandHandler('roll', roll_dice)
+odds_handler = CommandHandler('odds', roll_odds)
+seed_handler = CommandHandler('seed', seed)
+roll_stats_handler = CommandHandler('rollstats', roll_stats)
 init_roll_handler = CommandHandler('initroll', init_roll)
 stat_all_handler = CommandHandler('statall', stat_all)
 check_handler = CommandHandler('check', check)
@@ -321,35 +596,69 @@ check_all_handler = CommandHandler('checkall', check_all)
 help_command_handler = CommandHandler('help', help_command)
 modify_handler = CommandHandler('modify', modify)
 modify_all_handler = CommandHandler('modifyall', modify_all)
+apply_handler = CommandHandler('apply', apply_changes)
 changelog_handler = CommandHandler('changelog', changelog)
 talent_handler = CommandHandler('talent', talent)
 destiny_handler = CommandHandler('destiny', destiny)
 save_handler = CommandHandler('save', save)
 save_all_handler = CommandHandler('saveall', save_all)
-dispatcher.add_handler(load_handler)
-dispatcher.add_handler(loadall_handler)
-dispatcher.add_handler(unload_handler)
-dispatcher.add_handler(update_handler)
-dispatcher.add_handler(list_player_handler)
-dispatcher.add_handler(stat_handler)
-dispatcher.add_handler(start_handler)
-dispatcher.add_handler(stop_handler)
-dispatcher.add_handler(highest_handler)
-dispatcher.add_handler(sitrep_handler)
-dispatcher.add_handler(roll_handler)
-dispatcher.add_handler(init_roll_handler)
-dispatcher.add_handler(stat_all_handler)
-dispatcher.add_handler(check_handler)
-dispatcher.add_handler(check_all_handler)
-dispatcher.add_handler(help_command_handler)
-dispatcher.add_handler(modify_handler)
-dispatcher.add_handler(modify_all_handler)
-dispatcher.add_handler(changelog_handler)
-dispatcher.add_handler(talent_handler)
-dispatcher.add_handler(destiny_handler)
-dispatcher.add_handler(save_handler)
-dispatcher.add_handler(save_all_handler)
-
-dispatcher.add_error_handler(error_callback)
-
-updater.start_polling(poll_interval=0.5)
+import_pdf_handler = CommandHandler('importpdf', import_pdf)
+export_pdf_handler = CommandHandler('exportpdf', export_pdf)
+#Only when run as the bot. The process pool's workers start fresh and import this file too,
+#   and they mustn't open the logs or start the threads and polling a second time.
+if __name__ == '__main__':
+    backend = open_backend(SHEETBACKEND, CHARFOLDER)
+    rollLog = RollLog(HISTORYFOLDER / 'rolls.log')
+    #Changed players are saved in the background once they've gone SAVEDELAY seconds without another change.
+    saver = SaveWorker(SAVEDELAY)
+    saver.start()
+    sessions = SessionRegistry(SESSIONFOLDER, SESSIONBUDGET, backend, close_players, restore_players)
+    if WATCHSHEETS:
+        watcher = SheetWatcher(CHARFOLDER, sheet_changed)
+        watcher.start()
+
+    updater = Updater(TOKEN, use_context=True)
+    dispatcher = updater.dispatcher
+    dispatcher.add_handler(load_handler)
+    dispatcher.add_handler(loadall_handler)
+    dispatcher.add_handler(unload_handler)
+    dispatcher.add_handler(update_handler)
+    dispatcher.add_handler(list_player_handler)
+    dispatcher.add_handler(stat_handler)
+    dispatcher.add_handler(start_handler)
+    dispatcher.add_handler(stop_handler)
+    dispatcher.add_handler(highest_handler)
+    dispatcher.add_handler(top_handler)
+    dispatcher.add_handler(rank_handler)
+    dispatcher.add_handler(best_handler)
+    dispatcher.add_handler(sitrep_handler)
+    dispatcher.add_handler(roll_handler)
+    dispatcher.add_handler(odds_handler)
+    dispatcher.add_handler(seed_handler)
+    dispatcher.add_handler(roll_stats_handler)
+    dispatcher.add_handler(init_roll_handler)
+    dispatcher.add_handler(stat_all_handler)
+    dispatcher.add_handler(check_handler)
+    dispatcher.add_handler(check_all_handler)
+    dispatcher.add_handler(help_command_handler)
+    dispatcher.add_handler(modify_handler)
+    dispatcher.add_handler(modify_all_handler)
+    dispatcher.add_handler(apply_handler)
+    dispatcher.add_handler(changelog_handler)
+    dispatcher.add_handler(talent_handler)
+    dispatcher.add_handler(destiny_handler)
+    dispatcher.add_handler(save_handler)
+    dispatcher.add_handler(save_all_handler)
+    dispatcher.add_handler(import_pdf_handler)
+    dispatcher.add_handler(export_pdf_handler)
+
+    dispatcher.add_error_handler(error_callback)
+
+    updater.start_polling(poll_interval=0.5)
+    updater.idle()
+    #Stopped, so write out anything still waiting before we go.
+    saver.stop()
+    sessions.close() #Snapshots every table, so they're picked up again next run
+    rollLog.close()
+    if backend != None:
+        backend.close()
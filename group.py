@@ -6,66 +6,252 @@ This file is part of 'Droid Assistant Bot', which is released under the MIT lice
 Please see the license file that was included with this software.
 """
 
-from player import PlayerError, PlayerCharacter, CHARS, SKILLS
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from itertools import count
+from time import time
+import re
+import numpy as np
 
-class TokenPool(list):
+from player import (PlayerError, PlayerCharacter, CHAR_NAMES, SKILL_NAMES, DYNAMIC_NAMES,
+    GENERAL_NAMES, XP_NAMES, new_store, change_stat, change_stats, resolve_stat)
+from dice import odds, compile_pool, DiceError, EXACT_LIMIT
+
+#Every stat the Group keeps ranked, to (StatStore column, function giving the value to rank by from a row of it).
+#   Skills rank by [Rank, Pro, Ability] in that order, dynamics by current less threshold so the most
+#   worn down comes first, and xp by what's available to spend.
+RANKED = dict()
+for i, name in enumerate(CHAR_NAMES):
+    RANKED[name] = ('chars', lambda entry, i=i: int(entry[i]))
+for i, name in enumerate(SKILL_NAMES):
+    RANKED[name] = ('skills', lambda entry, i=i: tuple(entry[i].tolist()))
+for i, name in enumerate(DYNAMIC_NAMES):
+    RANKED[name] = ('dynamics', lambda entry, i=i: int(entry[i, 1] - entry[i, 0]))
+for i, name in enumerate(GENERAL_NAMES):
+    RANKED[name] = ('general', lambda entry, i=i: int(entry[i]))
+RANKED['xp'] = ('xp', lambda entry: int(entry[XP_NAMES.index('availableXp')]))
+#Each column to the ranked stats in it.
+COLUMN_STATS = dict()
+for name, (column, value) in RANKED.items():
+    COLUMN_STATS.setdefault(column, list()).append(name)
+
+def ordinal(number: int) -> str:
+    suffix = {1 : 'st', 2 : 'nd', 3 : 'rd'}.get(number % 10, 'th')
+    if 10 <= number % 100 <= 20:
+        suffix = 'th'
+    return f"{number}{suffix}"
+
+#One change in an /apply clause, like 'wounds+3' or 'strain - 2'.
+CHANGE_PATTERN = re.compile(r"([a-z][a-z_]*)\s*([+-])\s*(\d+)", re.IGNORECASE)
+
+def parse_changes(text: str) -> list:
+    """
+    Parse a batch of changes like 'wounds+3 strain-2 @kira @vex; credits+500 @all'. Clauses are
+    split by ';', and each gives changes and the players, '@name' or '@all', they're made to.
+    Returns a list of ([(stat, value)...], [name...]) for each clause, names lowercase.
+    """
+    clauses = list()
+    for clause in text.split(';'):
+        if clause.strip() == '':
+            continue
+        names = [name.lower() for name in re.findall(r"@(\S+)", clause)]
+        rest = re.sub(r"@\S+", ' ', clause)
+        changes = [(stat, int(sign + amount)) for stat, sign, amount in CHANGE_PATTERN.findall(rest)]
+        leftover = CHANGE_PATTERN.sub(' ', rest).split()
+        if len(leftover) > 0:
+            raise PlayerError(f"Couldn't read {' '.join(leftover)!r}, changes look like 'wounds+3' or 'credits-50'")
+        if len(changes) == 0:
+            raise PlayerError(f"No changes given in {clause.strip()!r}")
+        if len(names) == 0:
+            raise PlayerError(f"No players given for {clause.strip()!r}, add them like '@kira' or '@all'")
+        clauses.append((changes, names))
+    if len(clauses) == 0:
+        raise PlayerError("Nothing to apply. Try '/apply wounds+3 strain-2 @kira @vex; credits+500 @all'")
+    return clauses
+
+class RankIndex(object):
     """
-    This class holds the destiny pool for the group. It inherits a list, becomes a list of strs.
-    With 'Light' and 'Dark' respectively. We can thus quickly use len() and
-    sum() to get info and make decisions, and list's builtin count() to get a tally.
+    One stat's (value, row) pairs for every player, kept sorted lowest first as they change,
+    so the highest and anyone's rank are a bisect away instead of a scan over the group.
+    """
+    def __init__(self) -> None:
+        self.entries = list()
+        self.values = dict() #row to its value, to find its entry again
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def update(self, row: int, value) -> None:
+        if row in self.values:
+            if self.values[row] == value:
+                return
+            self.remove(row)
+        insort(self.entries, (value, row))
+        self.values[row] = value
+
+    def remove(self, row: int) -> None:
+        value = self.values.pop(row, None)
+        if value != None:
+            del self.entries[bisect_left(self.entries, (value, row))]
+
+    def tied(self, value) -> list:
+        """The rows with value."""
+        return [row for _, row in self.entries[bisect_left(self.entries, (value,)):bisect_right(self.entries, (value, float('inf')))]]
+
+    def highest(self) -> tuple:
+        """Returns (the highest value, the rows tied on it)."""
+        value = self.entries[-1][0]
+        return value, self.tied(value)
+
+    def rank(self, row: int) -> tuple:
+        """
+        Returns (rank, how many share it) of row, counted from 1 for the highest. Tied rows share
+        the best rank they cover, and the next rank down skips past them, so 1, 2, 2, 4.
+        """
+        value = self.values[row]
+        above = len(self.entries) - bisect_right(self.entries, (value, float('inf')))
+        return above + 1, len(self.tied(value))
+
+    def top(self, n: int) -> list:
+        """
+        Returns the top n as a list of (rank, value, rows), one per distinct value. Everyone tied
+        with the nth is included, so there can be more than n rows.
+        """
+        result = list()
+        position = len(self.entries)
+        taken = 0
+        while position > 0 and taken < n:
+            value = self.entries[position - 1][0]
+            start = bisect_left(self.entries, (value,))
+            rows = [row for _, row in self.entries[start:position]]
+            result.append((taken + 1, value, rows))
+            taken += len(rows)
+            position = start
+        return result
+
+#One thing done to a TokenPool, and the light and dark tokens it left. kind is 'roll', 'set',
+#   'light' or 'dark' for using a token, or 'undo'.
+DestinyEvent = namedtuple('DestinyEvent', ['time', 'kind', 'light', 'dark'])
+
+class TokenPool(object):
+    """
+    This class holds the destiny pool for the group, as counts of the light and dark tokens in it.
+    Everything done to it is also kept in self.history, oldest first, and tallied as it happens in
+    self.tally, so the session's destiny stats never need a pass over the history.
+    lightUsed and darkUsed count the tokens used since the pool was last rolled or set, and the
+    uses since then can be taken back, newest first, with undo().
     """
     def __init__(self, lightside = 0, darkside = 0) -> None:
+        self.light = lightside
+        self.dark = darkside
         self.lightUsed = 0
         self.darkUsed = 0
-        pool = list()
-        pool += ['Light'] * lightside
-        pool += ['Dark'] * darkside
-        super().__init__(pool)
+        self.flips = list() #Kinds of the uses undo() can still take back, newest last
+        self.history = list()
+        self.tally = {'roll' : 0, 'set' : 0, 'light' : 0, 'dark' : 0, 'undo' : 0,
+            'rolledLight' : 0, 'rolledDark' : 0}
 
-    def define(self, points: str) -> None:
-        self.clear()
-        points = points.lower()
-        self.extend(['Light'] * points.count('l'))
-        self.extend(['Dark'] * points.count('d'))
+    def __len__(self) -> int:
+        return self.light + self.dark
 
-    def clear(self):
-        """
-        Intercept the call to list.clear() so we can also clear our custom fields.
-        """
+    def __record__(self, kind: str) -> None:
+        self.history.append(DestinyEvent(time(), kind, self.light, self.dark))
+        self.tally[kind] += 1
+
+    def __reset__(self, light: int, dark: int, kind: str) -> None:
+        self.light = light
+        self.dark = dark
         self.lightUsed = 0
         self.darkUsed = 0
-        super().clear()
+        self.flips = list()
+        self.__record__(kind)
+
+    def roll(self, light: int, dark: int) -> None:
+        """
+        Start a new pool with what the force dice rolled.
+        """
+        self.__reset__(light, dark, 'roll')
+        self.tally['rolledLight'] += light
+        self.tally['rolledDark'] += dark
+
+    def define(self, points: str) -> None:
+        points = points.lower()
+        self.__reset__(points.count('l'), points.count('d'), 'set')
 
     def getPoolDesc(self):
-        self.sort() #Sort them all so they are in order
-        self.reverse() #Then reverse so lightside is first
-        message = f"[ {'-'.join(self)} ]"
+        tokens = ['Light'] * self.light + ['Dark'] * self.dark #Lightside first
+        message = f"[ {'-'.join(tokens)} ]"
         return message
 
     def useLightside(self):
-        if self.count('Light') > 0:
-            self.remove('Light')
-            self.append('Dark')
-            self.lightUsed +=1
-            return f"Used a lightside token. There are {self.count('Light')} remaining."
+        if self.light > 0:
+            self.light -= 1
+            self.dark += 1
+            self.lightUsed += 1
+            self.flips.append('light')
+            self.__record__('light')
+            return f"Used a lightside token. There are {self.light} remaining."
         else:
             return "No lightside tokens available to be used."
 
     def useDarkside(self):
-        if self.count('Dark') > 0:
-            self.remove('Dark')
-            self.append('Light')
-            return f"Used a darkside token. There are {self.count('Dark')} remaining."
+        if self.dark > 0:
+            self.dark -= 1
+            self.light += 1
+            self.darkUsed += 1
+            self.flips.append('dark')
+            self.__record__('dark')
+            return f"Used a darkside token. There are {self.dark} remaining."
         else:
             return "No darkside tokens available to be used."
 
-    def addLight(self, count: int) -> None:
-        newLight = ['Light'] * count
-        self += newLight
+    def undo(self) -> str:
+        """
+        Take back the last token used since the pool was rolled or set.
+        """
+        if len(self.flips) == 0:
+            return "No token use to undo since the pool was last rolled or set."
+        kind = self.flips.pop()
+        if kind == 'light':
+            self.light += 1
+            self.dark -= 1
+            self.lightUsed -= 1
+        else:
+            self.dark += 1
+            self.light -= 1
+            self.darkUsed -= 1
+        self.__record__('undo')
+        return f"Took back a {kind}side token. " + self.getPoolDesc()
 
-    def addDark(self, count: int) -> None:
-        newDark = ['Dark'] * count
-        self += newDark
+    def get_stats(self) -> str:
+        """
+        Returns a summary of the destiny pool's use this session.
+        """
+        tally = self.tally
+        message = "Destiny this session:\n"
+        message += f"Rolled {tally['roll']} times, {tally['rolledLight']} light and {tally['rolledDark']} dark tokens in all. Set by hand {tally['set']} times.\n"
+        message += f"Lightside used: {tally['light']}, Darkside used: {tally['dark']}, taken back: {tally['undo']}\n"
+        message += f"Since the pool was last rolled or set: {self.lightUsed} light and {self.darkUsed} dark used.\n"
+        message += "Pool now: " + self.getPoolDesc()
+        return message
+
+    def to_data(self) -> dict:
+        """
+        Returns the pool and its history as a plain dict, for saving it with its session.
+        """
+        return {'light' : self.light, 'dark' : self.dark,
+            'lightUsed' : self.lightUsed, 'darkUsed' : self.darkUsed, 'flips' : self.flips,
+            'history' : [list(event) for event in self.history], 'tally' : self.tally}
+
+    @classmethod
+    def from_data(cls, data: dict) -> 'TokenPool':
+        pool = cls(data['light'], data['dark'])
+        pool.lightUsed = data['lightUsed']
+        pool.darkUsed = data['darkUsed']
+        pool.flips = list(data.get('flips', []))
+        pool.history = [DestinyEvent(*event) for event in data.get('history', [])]
+        pool.tally.update(data.get('tally', {}))
+        return pool
 
 class Group(dict):
     """
@@ -76,10 +262,37 @@ class Group(dict):
     base of operations information and the starship. Group assets and credits.
     For now though we will use it to hold the list of players. Overkill for now
     but later on it will be good to keep it all together.
+
+    The players' stats all live in self.store, a StatStore with a row per player, so the
+    group wide lookups below work on whole columns at once. self.ranks keeps a RankIndex for
+    every stat in RANKED, updated by the store whenever a stat is written, for /highest, /top and /rank.
     """
     def __init__(self) -> None:
         self.destiny = TokenPool()
         self.__players__ = {}
+        self.store = new_store()
+        self.ranks = {name : RankIndex() for name in RANKED}
+        self.byRow = dict() #Row of the store to the player in it
+        self.loadOrder = dict() #Row to when its player was added, ties are listed in that order
+        self.loadCount = count()
+        self.store.listeners.append(self.__reindex__)
+    def __reindex__(self, column, rows) -> None:
+        """
+        Listener for self.store, keeps self.ranks in step with every write. A column of None means the rows were removed.
+        """
+        if column == None:
+            for index in self.ranks.values():
+                for row in rows:
+                    index.remove(int(row))
+            return
+        array = self.store[column]
+        for name in COLUMN_STATS.get(column, list()):
+            value = RANKED[name][1]
+            for row in rows:
+                self.ranks[name].update(int(row), value(array[row]))
+    def __by_load__(self, rows: list) -> list:
+        """The players in rows, in the order they were loaded."""
+        return [self.byRow[row] for row in sorted(rows, key=self.loadOrder.__getitem__)]
     def __empty_check__(self) -> None:
         if len(self.__players__) < 1:
             raise PlayerError("No players loaded.")
@@ -89,16 +302,24 @@ class Group(dict):
         """
         if player.name in self.__players__:
             raise PlayerError(f"Player {player.name} is already loaded. Skipping...")
-        self.__players__[player.name] = player
+        with player.lock, self.store.lock: #Player first, same order as change_stats() and save()
+            player.move_to(self.store)
+            self.__players__[player.name] = player
+            self.byRow[player.row] = player
+            self.loadOrder[player.row] = next(self.loadCount)
     def remove_player(self, name: str) -> None:
         """
         Removes the player from self.__players__ while doing the needed error checking.
         """
         name = name.lower()
         try:
-            del self.__players__[name]
+            player = self.__players__.pop(name)
         except KeyError:
             raise PlayerError(f"Player {name} is not loaded. Skipping...")
+        with player.lock, self.store.lock:
+            del self.byRow[player.row]
+            del self.loadOrder[player.row]
+            player.move_to(new_store()) #So it still works on its own
     def get_player(self, name: str) -> PlayerCharacter:
         """
         Returns the PlayerCharacter item saved in self.__players__ under the key of the name given.
@@ -118,6 +339,17 @@ class Group(dict):
         """
         self.__empty_check__()
         return list(self.__players__.keys())
+    def get_players(self) -> list:
+        """
+        Returns all loaded PlayerCharacters as a list, empty if there are none.
+        """
+        return list(self.__players__.values())
+    def __rows__(self) -> tuple:
+        """
+        Returns the loaded players and an array of their rows in self.store, in the same order.
+        """
+        players = list(self.__players__.values())
+        return players, np.array([player.row for player in players], dtype=np.intp)
     def find_highest_stat(self, stat: str) -> list:
         """
         Is given the name of the stat we want to find out which loaded
@@ -132,93 +364,81 @@ class Group(dict):
                 names.append(player.name)
             return ', '.join(names)
 
-        stat = stat.lower()
-        players = list(self.__players__.values())
-        highest = players.pop(0) #Just start with the first player and work through them.
-        tied = list()
-        tied.append(highest)
-        if stat in map(str.lower, CHARS): #It's a characteristic #TODO: Maybe optimize by check against PlayerCharacter.chars.keys()?
-            for player in players:
-                if player.chars[stat] > highest.chars[stat]:
-                    highest = player
-                    tied.clear() 
-                    tied.append(highest)
-                elif player.chars[stat] == highest.chars[stat]:
-                    tied.append(player)
+        stat = resolve_stat(stat).name
+        with self.store.lock:
+            value, rows = self.ranks[stat].highest()
+            tied = self.__by_load__(rows)
+            highest = tied[0]
+            if stat in DYNAMIC_NAMES:
+                if len(tied) == 1:
+                    return f"Highest current {stat} is {highest.name} with: {self.__describe__(stat, highest)}"
+                else:
+                    names = inner_tied_names(tied)
+                    result = f"Tied for highest current {stat} is: {names}\n\n"
+                    printout = str()
+                    for player in tied:
+                        printout += f"{player.name}: {self.__describe__(stat, player)}\n"
+                    return result + printout
+            elif stat in SKILL_NAMES:
+                if len(tied) == 1:
+                    return f"Highest {stat} is {highest.name}'s: {self.__describe__(stat, highest)}"
+                else:
+                    names = inner_tied_names(tied)
+                    result = f"Tied for highest current {stat} is: {names}\n\n"
+                    printout = str()
+                    for player in tied:
+                        printout += f"{player.name}: {self.__describe__(stat, player)}\n"
+                    return result + printout
             if len(tied) == 1:
-                return f"Highest {stat} is {highest.name}'s: {highest.chars[stat]}"
+                return f"Highest {stat} is {highest.name}'s: {value}"
             else:
-                result = f"Tied for highest {stat} with {highest.chars[stat]} is:\n"
+                result = f"Tied for highest {stat} with {value} is:\n"
                 names = inner_tied_names(tied)
                 return result + names
-        elif stat in ['wounds', 'strain', 'encumbrance']:
-            for player in players:
-                #Highest should find the person most overloaded, so subtract the threshold 
-                #   from the current, produce a negative and see who is closest to 0 (most maxed out)
-                thisDyn = player.dynamics[stat][1] - player.dynamics[stat][0]
-                highDyn = highest.dynamics[stat][1] - highest.dynamics[stat][0]
-                if thisDyn > highDyn:
-                    highest = player
-                    tied.clear() 
-                    tied.append(highest)
-                elif thisDyn == highDyn:
-                    tied.append(player)
-            if len(tied) == 1:
-                return f"Highest current {stat} is {highest.name} with: Threshold {highest.dynamics[stat][0]}, Current {highest.dynamics[stat][1]}"
-            else:
-                names = inner_tied_names(tied)
-                result = f"Tied for highest current {stat} is: {names}\n\n"
-                printout = str()
-                for player in tied:
-                    printout += f"{player.name}: Threshold {player.dynamics[stat][0]}, Current {player.dynamics[stat][1]}\n"
-                return result + printout
-        elif stat in map(str.lower, SKILLS): 
-            for player in players:
-                if player.skills[stat] > highest.skills[stat]: #Lexicogriphal comparison... Rank, pro, then ability.
-                    highest = player
-                    tied.clear() 
-                    tied.append(highest)
-                elif player.skills[stat] == highest.skills[stat]:
-                    tied.append(player)
-            if len(tied) == 1:
-                return f"Highest {stat} is {highest.name}'s: Rank {highest.skills[stat][0]}, Pro {highest.skills[stat][1]}, Ability {highest.skills[stat][2]}"
-            else:
-                names = inner_tied_names(tied)
-                result = f"Tied for highest current {stat} is: {names}\n\n"
-                printout = str()
-                for player in tied:
-                    printout += f"{player.name}: Rank {player.skills[stat][0]}, Pro {player.skills[stat][1]}, Ability {player.skills[stat][2]}\n"
-                return result + printout
-        if stat in highest.general.keys(): #Genreal stats are only saved in the player.general
-            for player in players:
-                if player.general[stat] > highest.general[stat]:
-                    highest = player
-                    tied.clear() 
-                    tied.append(highest)
-                elif player.general[stat] == highest.general[stat]:
-                    tied.append(player)
-            if len(tied) == 1:
-                return f"Highest {stat} is {highest.name}'s: {highest.general[stat]}"
-            else:
-                result = f"Tied for highest {stat} with {highest.general[stat]} is:\n"
-                names = inner_tied_names(tied)
-                return result + names
-        if stat == 'xp': #XP is saved in both total and availible forms, but so we need to see total from highest?
-            for player in players:
-                if player.availableXp > highest.availableXp:
-                    highest = player
-                    tied.clear() 
-                    tied.append(highest)
-                elif player.availableXp == highest.availableXp:
-                    tied.append(player)
-            if len(tied) == 1:
-                return f"Highest {stat} is {highest.name}'s: {highest.availableXp}"
-            else:
-                result = f"Tied for highest {stat} with {highest.availableXp} is:\n"
-                names = inner_tied_names(tied)
-                return result + names
-        else:
-            raise PlayerError(f"{stat} is not a valid stat.")
+
+    def __describe__(self, stat: str, player: PlayerCharacter) -> str:
+        """
+        A player's value of a ranked stat, as /highest, /top and /rank show it.
+        """
+        found = resolve_stat(stat)
+        if found.kind == 'dynamic':
+            threshold, current = found.value(player)
+            return f"Threshold {threshold}, Current {current}"
+        if found.kind == 'skill':
+            rank, pro, ability = found.value(player)
+            return f"Rank {rank}, Pro {pro}, Ability {ability}"
+        return str(RANKED[stat][1](self.store[found.column][player.row]))
+
+    def top_stat(self, stat: str, n = 5) -> str:
+        """
+        Returns a formatted string of the n players highest in a stat, best first. Tied players
+        share a rank, and anyone tied with the last place is listed too.
+        """
+        self.__empty_check__()
+        stat = resolve_stat(stat).name
+        if n < 1:
+            raise PlayerError("Need to show at least 1 player.")
+        result = f"Top {n} for {stat}:\n"
+        with self.store.lock:
+            for rank, value, rows in self.ranks[stat].top(n):
+                for player in self.__by_load__(rows):
+                    tie = '=' if len(rows) > 1 else ''
+                    result += f"{rank}{tie}. {player.name}: {self.__describe__(stat, player)}\n"
+        return result
+
+    def rank_of(self, name: str, stat: str) -> str:
+        """
+        Returns a formatted string of where a player ranks in a stat among the loaded players.
+        """
+        player = self.get_player(name)
+        stat = resolve_stat(stat).name
+        with self.store.lock:
+            rank, tied = self.ranks[stat].rank(player.row)
+            result = f"{player.name} is {ordinal(rank)} of {len(self.__players__)} in {stat} with {self.__describe__(stat, player)}"
+            if tied > 1:
+                others = [other.name for other in self.__by_load__(self.ranks[stat].tied(self.ranks[stat].values[player.row])) if other != player]
+                result += f", tied with {', '.join(others)}"
+        return result
 
     def sit_rep(self) -> str:
         """
@@ -238,14 +458,46 @@ class Group(dict):
         tabulating groups stats and checks.
         """
         self.__empty_check__()
-        skill = skill.lower()
-        result = dict()
-        try:
-            for player in self.__players__.values():
-                result[player.name] = [player.skills[skill][1], player.skills[skill][2]]
-            return result
-        except KeyError: #TODO: this doesn't allow for custom skills that some but not all players have.
+        found = resolve_stat(skill)
+        if found.kind != 'skill': #TODO: this doesn't allow for custom skills that some but not all players have.
             raise PlayerError(f"Can't find skill: {skill}")
+        players, rows = self.__rows__()
+        dice = self.store.get('skills', rows)[:, found.index, 1:]
+        return {player.name : pool for player, pool in zip(players, dice.tolist())}
+
+    def check_chances(self, skill: str, checkDice) -> list:
+        """
+        Is given a skill and the dice expression, or compiled PoolSpec, to check against and returns
+        a list of (name, chance of success, expected advantage) for every loaded player, best first.
+        The odds are cached on each player's final pool, so asking again during a scene is instant.
+        Raises DiceError if any player's pool is past EXACT_LIMIT dice, before working any of them out.
+        """
+        if isinstance(checkDice, str):
+            checkDice = compile_pool(checkDice)
+        if checkDice.count('f') > 0:
+            raise DiceError("Force dice can't be used in a check.")
+        dice = self.skill_dice_list(skill)
+        pools = checkDice.resolve(np.array(list(dice.values()), dtype=np.int64).reshape(-1, 2))
+        biggest = int(pools.sum(axis=1).max(initial=0))
+        if biggest > EXACT_LIMIT:
+            raise DiceError(f"Exact odds only go up to {EXACT_LIMIT} dice and that check comes to {biggest}. " + \
+                "Try /odds for an estimate.")
+        result = list()
+        for name, pool in zip(dice, pools):
+            chances = odds(pool)
+            result.append((name, chances.success, chances.expectedAdvantage))
+        result.sort(key=lambda row: (row[1], row[2]), reverse=True)
+        return result
+
+    def best_for_check(self, skill: str, checkDice) -> str:
+        """
+        Returns a formatted string ranking the loaded players by how likely they are to pass a check.
+        """
+        chances = self.check_chances(skill, checkDice)
+        result = f"Best for a {skill.lower()} check is {chances[0][0]}:\n\n"
+        for name, success, advantage in chances:
+            result += f"{success:.1%} success, {advantage:+.2f} advantage - {name}\n"
+        return result
 
     def stat_list(self, stat: str) -> str:
         """
@@ -253,27 +505,53 @@ class Group(dict):
         """
         self.__empty_check__()
         result = str()
-        stat = stat.lower()
+        found = resolve_stat(stat)
         #TODO: this doesn't allow for custom skills that some but not all players have. We could use instead player.skills.keys() and etc, per player.
-        if stat in ['wounds', 'strain', 'encumbrance']:
+        if found.kind == 'dynamic':
             result = self.sit_rep()
-        elif stat in map(str.lower, CHARS):
-            for player in self.__players__.values():
-                result += f"Rank: {player.chars[stat]} - {player.name}\n"
-        elif stat in map(str.lower, SKILLS):
-            for player in self.__players__.values():
-                result += f"Rank: {player.skills[stat][0]}, Pro: {player.skills[stat][1]}, Ability: {player.skills[stat][2]} - {player.name}\n"
+        elif found.kind == 'char':
+            players, rows = self.__rows__()
+            values = self.store.get('chars', rows)[:, found.index]
+            for player, value in zip(players, values.tolist()):
+                result += f"Rank: {value} - {player.name}\n"
+        elif found.kind == 'skill':
+            players, rows = self.__rows__()
+            values = self.store.get('skills', rows)[:, found.index]
+            for player, (rank, pro, ability) in zip(players, values.tolist()):
+                result += f"Rank: {rank}, Pro: {pro}, Ability: {ability} - {player.name}\n"
         else:
             for player in self.__players__.values():
-                result += player.lookup_stat(stat)
+                result += player.lookup_stat(found.name)
                 result += '\n'
         return result
 
+    def apply_changes(self, text: str) -> str:
+        """
+        Make a batch of changes to the loaded players as one transaction, see parse_changes() for
+        how text reads. Every player and stat is checked before anything is changed, so a typo
+        anywhere changes nothing. Returns one message with every player's changes.
+        """
+        self.__empty_check__()
+        changes = list()
+        for stats, names in parse_changes(text):
+            if 'all' in names:
+                players = self.get_players()
+            else:
+                players = list()
+                for name in names:
+                    player = self.get_player(name)
+                    if player not in players:
+                        players.append(player)
+            for stat, value in stats:
+                changes.append((players, stat, value))
+        changed = change_stats(changes)
+        return '\n\n'.join(changed.values())
     def change_all(self, item: str, value: int) -> str:
-        item = item.lower()
-
+        """
+        Change a stat by value for every loaded player, as one operation on the store's column.
+        """
         message = str()
-        for player in self.__players__.values():
-            message += player.change(item, value)
+        for record in change_stat(list(self.__players__.values()), item, value):
+            message += record
             message += '\n'
         return message
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Droid Bot Assistant > history.py | Classes for logging every roll and keeping running statistics on them.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from pathlib import Path
+from threading import Lock
+from time import time
+import numpy as np
+
+from dice import DICE, SYMBOLS, FACE_COUNT, faceOffsets, faceLookup, Roll, GroupCheck
+
+#Every roll is saved as one fixed width record. Counts are 16 bit, plenty since dice.compile_pool
+#   never lets a pool past POOL_LIMIT dice, a couple hundred symbols at most.
+RECORD = np.dtype([
+    ('time', '<f8'),
+    ('chat', '<i8'),
+    ('player', 'S16'),
+    ('pool', '<u2', len(DICE)), #How many of each die, in DICE order
+    ('outcome', '<u2', len(SYMBOLS)), #How many of each symbol, in SYMBOLS order
+    ('faces', '<u2', FACE_COUNT)]) #How many times each side came up, see dice.faceOffsets
+
+#The file starts with MAGIC and then the number of records saved, both 8 bytes.
+MAGIC = np.frombuffer(b'DABROLL1', dtype='<u8')[0]
+HEADER = 16
+
+#Chi-squared value a fair die stays under 95% of the time, by degrees of freedom (sides - 1).
+CRITICAL = {5 : 11.070, 7 : 14.067, 11 : 19.675}
+
+class RollStats(object):
+    """
+    Running totals over a set of rolls, for a player or for a whole chat's session.
+    Updated as each roll comes in so nothing ever needs to be rescanned.
+    """
+    def __init__(self) -> None:
+        self.rolls = 0
+        self.netSuccess = 0
+        self.triumphs = 0 #Rolls with at least one triumph
+        self.faces = np.zeros(FACE_COUNT, dtype=np.int64)
+
+    def add(self, outcome: np.ndarray, faces: np.ndarray) -> None:
+        """
+        Add rolls to the totals. outcome is an array of symbol counts per roll, shape (rolls, symbols),
+        and faces the matching face histograms, shape (rolls, FACE_COUNT).
+        """
+        outcome = outcome.astype(np.int64)
+        s, a, x, t, f, d = (outcome[:, SYMBOLS.index(letter)] for letter in 'saxtfd')
+        self.rolls += len(outcome)
+        self.netSuccess += int((s + x - f - d).sum())
+        self.triumphs += int((x > 0).sum())
+        self.faces += faces.sum(axis=0, dtype=np.int64)
+
+    @property
+    def meanSuccess(self) -> float:
+        return self.netSuccess / self.rolls if self.rolls else 0.0
+
+    @property
+    def triumphRate(self) -> float:
+        return self.triumphs / self.rolls if self.rolls else 0.0
+
+    def fairness(self) -> dict:
+        """
+        Returns a dict of die letter to (times rolled, chi-squared, degrees of freedom) for every
+        die that has been rolled. Tests each side against coming up equally often.
+        """
+        result = dict()
+        for die in DICE:
+            sides = len(faceLookup[die])
+            counts = self.faces[faceOffsets[die]:faceOffsets[die] + sides]
+            rolled = int(counts.sum())
+            if rolled == 0:
+                continue
+            expected = rolled / sides
+            result[die] = (rolled, float(((counts - expected) ** 2).sum() / expected), sides - 1)
+        return result
+
+    def summary(self) -> str:
+        result = f"Rolls: {self.rolls}\n"
+        result += f"Average net success: {self.meanSuccess:+.2f}\n"
+        result += f"Triumph rate: {self.triumphRate:.1%}\n"
+        return result
+
+    def fairness_report(self) -> str:
+        result = str()
+        for die, (rolled, chiSquared, freedom) in self.fairness().items():
+            verdict = 'looks fair' if chiSquared < CRITICAL[freedom] else 'looks off'
+            #Too few rolls and the test means nothing, roughly 5 a side is the usual rule.
+            if rolled < 5 * (freedom + 1):
+                verdict = 'too few rolls to tell'
+            result += f"{die}: {rolled} rolled, chi-squared {chiSquared:.2f} on {freedom} df, {verdict}\n"
+        return result
+
+class RollLog(object):
+    """
+    Append only log of every roll, kept as fixed width RECORDs in a memory mapped file.
+    The file grows by doubling. Per player and per chat RollStats are built once when the
+    log is opened and then updated with every append, so asking for them is a dict lookup.
+    Records land in the page cache as soon as they're written, so they survive the bot
+    crashing, and flush() or close() pushes them to disk.
+    """
+    def __init__(self, path: Path, capacity = 1024) -> None:
+        self.path = Path(path)
+        self.lock = Lock()
+        self.playerStats = dict() #(chat, player) to RollStats
+        self.sessionStats = dict() #chat to RollStats
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'wb') as file:
+                file.write(np.array([MAGIC, 0], dtype='<u8').tobytes())
+                file.truncate(HEADER + capacity * RECORD.itemsize)
+        self.header = np.memmap(self.path, dtype='<u8', mode='r+', shape=(2,))
+        if self.header[0] != MAGIC:
+            raise ValueError(f"{self.path} is not a roll log")
+        self.__map__()
+        self.__add_stats__(self.records[:self.count])
+
+    @property
+    def count(self) -> int:
+        return int(self.header[1])
+
+    def __map__(self) -> None:
+        capacity = (self.path.stat().st_size - HEADER) // RECORD.itemsize
+        self.records = np.memmap(self.path, dtype=RECORD, mode='r+', offset=HEADER, shape=(capacity,))
+
+    def __grow__(self, needed: int) -> None:
+        capacity = max(len(self.records) * 2, needed)
+        self.records.flush()
+        del self.records
+        with open(self.path, 'r+b') as file:
+            file.truncate(HEADER + capacity * RECORD.itemsize)
+        self.__map__()
+
+    def __add_stats__(self, records: np.ndarray) -> None:
+        for chat in np.unique(records['chat']):
+            inChat = records[records['chat'] == chat]
+            self.sessionStats.setdefault(int(chat), RollStats()).add(inChat['outcome'], inChat['faces'])
+            for player in np.unique(inChat['player']):
+                byPlayer = inChat[inChat['player'] == player]
+                key = (int(chat), player.decode(errors='ignore'))
+                self.playerStats.setdefault(key, RollStats()).add(byPlayer['outcome'], byPlayer['faces'])
+
+    def append(self, chat: int, players: list, pools: np.ndarray, outcomes: np.ndarray, faces: np.ndarray) -> None:
+        """
+        Append one record per player, with the matching rows of pools, outcomes and faces.
+        """
+        with self.lock:
+            start = self.count
+            end = start + len(players)
+            if end > len(self.records):
+                self.__grow__(end)
+            new = self.records[start:end]
+            new['time'] = time()
+            new['chat'] = chat
+            #Names are cut to fit the record, and so are the stats keys so they match when reloaded.
+            names = [name.encode()[:16] for name in players]
+            new['player'] = names
+            new['pool'] = pools
+            new['outcome'] = outcomes
+            new['faces'] = faces
+            self.header[1] = end
+            self.__add_stats__(np.asarray(new))
+
+    def record_roll(self, chat: int, player: str, roll: Roll) -> None:
+        """
+        Log a single Roll. It has to have been made with keepFaces.
+        """
+        self.append(chat, [player], roll.pool[None], np.array([roll.counts]), roll.histogram()[None])
+
+    def record_group(self, chat: int, result: GroupCheck) -> None:
+        """
+        Log every player's roll of a GroupCheck. It has to have been made with keepFaces.
+        """
+        if len(result) == 0:
+            return
+        self.append(chat, result.names, result.rolls.pools, result.rolls.tally, result.rolls.faces)
+
+    def player_stats(self, chat: int, player: str) -> RollStats:
+        return self.playerStats.get((chat, player.encode()[:16].decode(errors='ignore')), RollStats())
+
+    def session_stats(self, chat: int) -> RollStats:
+        return self.sessionStats.get(chat, RollStats())
+
+    def flush(self) -> None:
+        with self.lock:
+            self.records.flush()
+            self.header.flush()
+
+    def close(self) -> None:
+        self.flush()
+        del self.records
+        del self.header
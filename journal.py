@@ -0,0 +1,126 @@
+"""
+Droid Bot Assistant > journal.py | Append only journal of the changes made to a player's stats.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from collections import namedtuple
+from pathlib import Path
+from threading import Lock, Timer
+from time import monotonic
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+#One change to one stat. time is seconds since the epoch, delta what was asked for, old and new
+#   what the stat really went from and to, which differ from delta when it's kept from going below 0.
+Entry = namedtuple('Entry', ['time', 'stat', 'delta', 'old', 'new'])
+
+class Journal(object):
+    """
+    A player's changes since the sheet was last saved, oldest first. Given a path every entry is
+    also written to it as a line of JSON as it happens, so a crash loses nothing. The file is
+    flushed on every append, but only fsynced every batch entries or interval seconds, or on sync(),
+    since that is the slow part. A timer makes sure of the interval when no more appends come along
+    to do it. Without a path it only keeps them in memory.
+    """
+    def __init__(self, path = None, batch = 16, interval = 1.0) -> None:
+        self.path = None if path == None else Path(path)
+        self.batch = batch
+        self.interval = interval
+        self.lock = Lock()
+        self.entries = list()
+        self.file = None
+        self.unsynced = 0
+        self.lastSync = monotonic()
+        self.timer = None #Waiting to sync what append() left unsynced
+        if self.path != None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.entries = self.read()
+            self.file = open(self.path, 'a')
+
+    def read(self) -> list:
+        """
+        Returns the entries saved in the file. A line cut short by a crash is skipped.
+        """
+        entries = list()
+        try:
+            with open(self.path) as file:
+                for line in file:
+                    try:
+                        entries.append(Entry(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        logger.warning(f"Skipping broken line in {self.path}: {line!r}")
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, entries: list) -> None:
+        with self.lock:
+            self.entries.extend(entries)
+            if self.file == None:
+                return
+            for entry in entries:
+                self.file.write(json.dumps(entry._asdict(), separators=(',', ':')) + '\n')
+            self.file.flush()
+            self.unsynced += len(entries)
+            if self.unsynced >= self.batch or monotonic() - self.lastSync >= self.interval:
+                self.__sync__()
+            elif self.timer == None:
+                self.timer = Timer(self.interval - (monotonic() - self.lastSync), self.__timed_sync__)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def __timed_sync__(self) -> None:
+        with self.lock:
+            self.timer = None
+            self.__sync__()
+
+    def __sync__(self) -> None:
+        if self.file != None and self.unsynced > 0:
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.lastSync = monotonic()
+
+    def sync(self) -> None:
+        with self.lock:
+            self.__sync__()
+
+    def clear(self) -> None:
+        """
+        Forget every entry, once they've been saved to the sheet.
+        """
+        with self.lock:
+            self.entries = list()
+            if self.file != None:
+                self.file.truncate(0)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.unsynced = 0
+
+    def page(self, number: int, size: int) -> tuple:
+        """
+        Returns (entries, pages), the entries on page number, counted from 1, newest first,
+        and how many pages there are.
+        """
+        with self.lock:
+            pages = max(1, -(-len(self.entries) // size))
+            end = len(self.entries) - (number - 1) * size
+            return self.entries[max(0, end - size):max(0, end)][::-1], pages
+
+    def close(self) -> None:
+        with self.lock:
+            if self.timer != None:
+                self.timer.cancel()
+                self.timer = None
+            if self.file != None:
+                self.__sync__()
+                self.file.close()
+                self.file = None
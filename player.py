@@ -9,9 +9,22 @@ Please see the license file that was included with this software.
 from os import name
 from typing import NewType
 from PyPDF2 import PdfFileReader, PdfFileWriter
-from PyPDF2.generic import StreamObject, BooleanObject, NameObject, IndirectObject
-from time import strftime, localtime
+from PyPDF2.generic import (BooleanObject, NameObject, IndirectObject, DictionaryObject,
+    NumberObject, createStringObject)
+from io import BytesIO
+import os
+from time import strftime, localtime, time
 from pathlib import Path
+from concurrent.futures import as_completed
+from threading import RLock
+from collections import namedtuple
+from contextlib import ExitStack
+
+from sheetcache import SheetCache, fingerprint, file_hash
+from statstore import StatStore
+from journal import Journal, Entry
+from statnames import StatResolver
+from workers import get_executor
 
 #Create custom Exceptions so we can handle errors without catching them all.
 class Error(Exception):
@@ -51,7 +64,37 @@ CHARS=[
     'Force Rank' ,
     'Soak']
 
-#Dynamics are loaded manually in PlayerCharacter.__load_dynams__()
+#Field names of each dynamic, threshold first and current second. Loaded in PlayerCharacter.__load_dynams__()
+DYNAMICS = {
+    'wounds' : ('WT', 'WT Current'),
+    'strain' : ('ST', 'ST Current'),
+    'encumbrance' : ('Worn / Generally Carried Encumberance Threshold', 'Worn / Generally Carried Encumberance Current')}
+
+#Field names of the general stats and XP.
+GENERAL = {'credits' : 'Personal Finances Available Credits', 'duty' : 'Total Duty'}
+XP = {'availableXp' : 'Available XP', 'totalXp' : 'Total XP'}
+
+#The fields save() writes back to the sheet, and where each one's value comes from.
+SAVED_FIELDS = {
+    'ST Current' : lambda player: player.dynamics['strain'][1],
+    'WT Current' : lambda player: player.dynamics['wounds'][1],
+    XP['totalXp'] : lambda player: player.totalXp,
+    XP['availableXp'] : lambda player: player.availableXp,
+    GENERAL['duty'] : lambda player: player.general['duty'],
+    GENERAL['credits'] : lambda player: player.general['credits']}
+
+#The saved fields each stat change() can touch. Encumbrance isn't saved so it has none.
+CHANGED_FIELDS = {
+    'wounds' : ['WT Current'],
+    'strain' : ['ST Current'],
+    'encumbrance' : [],
+    'duty' : [GENERAL['duty']],
+    'credits' : [GENERAL['credits']],
+    'totalXp' : [XP['totalXp']],
+    'availableXp' : [XP['availableXp']]}
+
+#How many talent slots are on the sheet, each with a name, ranks and description field.
+TALENT_SLOTS = 36
 
 SKILLS=[
     'Astrogation', 'Athletics', 'Charm', 'Coercion',
@@ -64,15 +107,372 @@ SKILLS=[
     'CoreWorlds', 'Education', 'Lore', 'OuterRim',
     'Underworld', 'Warfare', 'Xenology']
 
+#Layout of the StatStore every player's stats live in, one row per player across every column.
+#   Skills are [Rank, Pro, Ability] and dynamics [Threshold, Current], in the order of the names.
+CHAR_NAMES = [name.lower() for name in CHARS]
+SKILL_NAMES = [name.lower() for name in SKILLS]
+DYNAMIC_NAMES = list(DYNAMICS)
+GENERAL_NAMES = list(GENERAL)
+XP_NAMES = list(XP)
+STORE_COLUMNS = {
+    'chars' : (len(CHAR_NAMES),),
+    'skills' : (len(SKILL_NAMES), 3),
+    'dynamics' : (len(DYNAMIC_NAMES), 2),
+    'general' : (len(GENERAL_NAMES),),
+    'xp' : (len(XP_NAMES),)}
+
+#What change() can change, as a list of the stats each name changes.
+#   Each is (stat as journaled, name for the log, column, index, floor).
+CHANGES = {name : [(name, name, 'dynamics', (i, 1), 0)] for i, name in enumerate(DYNAMIC_NAMES)}
+CHANGES.update({name : [(name, name, 'general', (i,), None)] for i, name in enumerate(GENERAL_NAMES)})
+CHANGES['xp'] = [
+    ('availableXp', 'Availible XP', 'xp', (XP_NAMES.index('availableXp'),), None),
+    ('totalXp', 'Total XP', 'xp', (XP_NAMES.index('totalXp'),), None)]
+#Most a stat can be changed by in one go. A billion credits is already more than any table needs,
+#   and it keeps a single change far inside what the StatStore's int64 columns hold.
+CHANGE_LIMIT = 10 ** 9
+#Each journaled stat to its (name for the log, column, index), for replaying and showing the journal.
+JOURNAL_STATS = {stat : (label, column, index) for changes in CHANGES.values() for stat, label, column, index, floor in changes}
+
+class Stat(namedtuple('Stat', ['name', 'kind', 'column', 'index'])):
+    """
+    A stat as resolve_stat() finds it. name is the canonical name, kind one of 'char', 'skill',
+    'dynamic', 'general' or 'xp', and column and index where it lives in a player's StatStore row.
+    """
+    __slots__ = ()
+
+    def value(self, player: 'PlayerCharacter'):
+        """
+        The player's value of this stat. An int, [Rank, Pro, Ability] for skills, [Threshold, Current]
+        for dynamics, and [Available, Total] for xp.
+        """
+        entry = player.store[self.column][player.row]
+        if self.index == None:
+            return entry.tolist()
+        return entry[self.index].tolist()
+
+#How skills are written in the rulebook, where the sheet runs the words together.
+SKILL_DISPLAY = {
+    'pilotingplanetary' : 'Piloting (Planetary)', 'pilotingspace' : 'Piloting (Space)',
+    'rangedlight' : 'Ranged (Light)', 'rangedhvy' : 'Ranged (Heavy)',
+    'coreworlds' : 'Core Worlds', 'outerrim' : 'Outer Rim'}
+#Other names people use for skills, where the sheet names don't say what people do.
+SKILL_ALIASES = {
+    'rangedhvy' : ['ranged heavy'],
+    'pilotingplanetary' : ['pilot planetary', 'planetary'],
+    'pilotingspace' : ['pilot space']}
+
+#Every stat name, alias and unambiguous prefix people might type, to its Stat. See resolve_stat().
+#   Each is added under how it's written for people, which messages use, and its Stat.name as an alias.
+STATS = StatResolver()
+for i, name in enumerate(CHAR_NAMES):
+    STATS.add(CHARS[i], Stat(name, 'char', 'chars', i), name)
+for i, name in enumerate(SKILL_NAMES):
+    STATS.add(SKILL_DISPLAY.get(name, SKILLS[i]), Stat(name, 'skill', 'skills', i), name, *SKILL_ALIASES.get(name, []))
+for i, name in enumerate(DYNAMIC_NAMES):
+    STATS.add(name.capitalize(), Stat(name, 'dynamic', 'dynamics', i), name)
+for i, name in enumerate(GENERAL_NAMES):
+    STATS.add(name.capitalize(), Stat(name, 'general', 'general', i), name)
+STATS.add('XP', Stat('xp', 'xp', 'xp', None), 'xp', 'exp', 'experience')
+
+def resolve_stat(name: str) -> Stat:
+    """
+    Returns the Stat name means, given in any case or spacing, as an alias or as the start of
+    just one stat's name. Raises PlayerError saying what it could be otherwise.
+    """
+    stat = STATS.resolve(name)
+    if stat != None:
+        return stat
+    matches = STATS.ambiguous(name)
+    if len(matches) > 1:
+        raise PlayerError(f"{name!r} could be any of: {', '.join(matches)}")
+    suggestions = STATS.suggest(name)
+    if len(suggestions) > 0:
+        raise PlayerError(f"Unable to find stat named {name!r}. Did you mean {' or '.join(suggestions)}?")
+    raise PlayerError(f"Unable to find stat named {name!r}")
+
+#How many changes /changelog shows at a time.
+CHANGELOG_PAGE = 20
+
+def new_store() -> StatStore:
+    return StatStore(STORE_COLUMNS)
+
+def store_row(data: dict) -> dict:
+    """
+    Turn the stats of a to_data() dict into a StatStore row.
+    """
+    return {
+        'chars' : [data['chars'][name] for name in CHAR_NAMES],
+        'skills' : [data['skills'][name] for name in SKILL_NAMES],
+        'dynamics' : [data['dynamics'][name] for name in DYNAMIC_NAMES],
+        'general' : [data['general'][name] for name in GENERAL_NAMES],
+        'xp' : [data[name] for name in XP_NAMES]}
+
+class FieldPlan(object):
+    """
+    The form fields the loader actually reads, worked out once so read_fields() can walk the
+    PDF's AcroForm a single time and skip everything else on the sheet. self.kids are the
+    fields, the skills, whose kids get resolved too.
+    """
+    def __init__(self, names: set, kids: set) -> None:
+        self.names = frozenset(names) | frozenset(kids)
+        self.kids = frozenset(kids)
+        #Parents of any nested names, the only fields worth walking down into.
+        self.parents = frozenset(name.rsplit('.', 1)[0] for name in self.names if '.' in name)
+
+    def wants_kids_of(self, name: str) -> bool:
+        return name in self.parents or any(parent.startswith(name + '.') for parent in self.parents)
+
+def sheet_plan() -> FieldPlan:
+    """
+    The core of the sheet that every command uses, loaded up front.
+    """
+    names = {'Name'}
+    names.update(CHARS)
+    for threshold, current in DYNAMICS.values():
+        names.update([threshold, current])
+    names.update(GENERAL.values())
+    names.update(XP.values())
+    return FieldPlan(names, SKILLS)
+
+def talent_plan() -> FieldPlan:
+    """
+    The talents, only read when first asked for.
+    """
+    names = set()
+    for i in range(1, TALENT_SLOTS + 1):
+        names.update([f"Character Talents Name {i}", f"Character Talents Ranks {i}", f"Character Talents Description {i}"])
+    return FieldPlan(names, set())
+
+FIELD_PLAN = sheet_plan()
+TALENT_PLAN = talent_plan()
+
+def read_fields(pdf: PdfFileReader, plan = FIELD_PLAN) -> dict:
+    """
+    Walk the AcroForm field tree of the pdf once and return a dict of fully qualified field name to
+    its attributes, the same shape as PdfFileReader.getFields(), but only for the fields in plan.
+    Only the indirect objects on the way to those fields are resolved, and the walk stops as soon
+    as they have all been found. For fields in plan.kids, '/Kids' holds the resolved kid objects.
+    """
+    try:
+        fields = pdf.trailer['/Root']['/AcroForm']['/Fields']
+    except KeyError:
+        raise PlayerError("PDF has no form fields")
+    found = dict()
+    stack = [(field, '') for field in reversed(fields)]
+    while stack and len(found) < len(plan.names):
+        field, parent = stack.pop()
+        field = field.getObject()
+        partial = field.get('/T')
+        name = parent if partial == None else (f"{parent}.{partial}" if parent else partial)
+        if name in plan.names:
+            entry = dict()
+            if '/V' in field:
+                entry['/V'] = field['/V']
+            if name in plan.kids:
+                entry['/Kids'] = [kid.getObject() for kid in field.get('/Kids', [])]
+            found[name] = entry
+        elif '/Kids' in field and (partial == None or plan.wants_kids_of(name)):
+            stack.extend((kid, name) for kid in reversed(field['/Kids']))
+    return found
+
+def field_refs(pdf: PdfFileReader, names: set) -> dict:
+    """
+    Returns a dict of field name to the reference of the field's object, for the top level
+    fields in names. Fields stored directly in the /Fields array, not as their own object, come back as is.
+    """
+    found = dict()
+    for field in pdf.trailer['/Root']['/AcroForm']['/Fields']:
+        name = field.getObject().get('/T')
+        if name in names:
+            found[name] = field
+            if len(found) == len(names):
+                break
+    return found
+
+def last_startxref(file) -> int:
+    """
+    Returns the offset of the newest cross reference section, from the 'startxref' at the end of the file.
+    """
+    file.seek(0, os.SEEK_END)
+    file.seek(max(file.tell() - 1024, 0))
+    tail = file.read()
+    position = tail.rfind(b'startxref')
+    if position == -1:
+        raise PlayerError("PDF has no startxref")
+    return int(tail[position + len(b'startxref'):].split()[0])
+
+def copy_dict(obj: DictionaryObject) -> DictionaryObject:
+    """Shallow copy that keeps references as references instead of resolving them."""
+    copy = DictionaryObject()
+    for key in obj.keys():
+        copy[key] = obj.raw_get(key)
+    return copy
+
+def append_field_update(fileName: Path, values: dict) -> bool:
+    """
+    Write values, a dict of field name to new str value, to the PDF as a standard incremental update:
+    new versions of just those field objects, a cross reference section for them, and a trailer
+    pointing back at the previous one, all appended to the end of the file. The existing bytes are
+    never touched. Also turns on NeedAppearances so viewers redraw the changed fields.
+    Returns False, having written nothing, if the PDF can't take it: it's encrypted, uses cross
+    reference streams, or a field isn't its own object.
+    """
+    if not values:
+        return True
+    with open(fileName, "rb") as file:
+        pdf = PdfFileReader(file)
+        if '/Encrypt' in pdf.trailer:
+            return False
+        previous = last_startxref(file)
+        file.seek(previous)
+        if file.read(4) != b'xref': #A cross reference stream, which a plain xref section can't follow.
+            return False
+        refs = field_refs(pdf, set(values))
+        if len(refs) != len(values) or not all(isinstance(ref, IndirectObject) for ref in refs.values()):
+            return False
+
+        objects = dict()
+        for name, ref in refs.items():
+            field = copy_dict(ref.getObject())
+            field[NameObject('/V')] = createStringObject(values[name])
+            objects[(ref.idnum, ref.generation)] = field
+        root = pdf.trailer.raw_get('/Root')
+        catalog = pdf.trailer['/Root']
+        form = catalog['/AcroForm']
+        if not getattr(form.get('/NeedAppearances'), 'value', False):
+            form = copy_dict(form)
+            form[NameObject('/NeedAppearances')] = BooleanObject(True)
+            formRef = catalog.raw_get('/AcroForm')
+            if isinstance(formRef, IndirectObject):
+                objects[(formRef.idnum, formRef.generation)] = form
+            else: #The AcroForm lives in the catalog, so the catalog gets a new version.
+                catalog = copy_dict(catalog)
+                catalog[NameObject('/AcroForm')] = form
+                objects[(root.idnum, root.generation)] = catalog
+
+        trailer = DictionaryObject()
+        trailer[NameObject('/Size')] = NumberObject(max(pdf.trailer['/Size'], max(idnum for idnum, _ in objects) + 1))
+        trailer[NameObject('/Root')] = root
+        trailer[NameObject('/Prev')] = NumberObject(previous)
+        for key in ['/Info', '/ID']:
+            if key in pdf.trailer:
+                trailer[NameObject(key)] = pdf.trailer.raw_get(key)
+        file.seek(0, os.SEEK_END)
+        start = file.tell()
+
+    update = BytesIO()
+    update.write(b"\n")
+    offsets = dict()
+    for (idnum, generation), obj in sorted(objects.items()):
+        offsets[idnum] = (start + update.tell(), generation)
+        update.write(f"{idnum} {generation} obj\n".encode())
+        obj.writeToStream(update, None)
+        update.write(b"\nendobj\n")
+    xref = start + update.tell()
+    update.write(b"xref\n0 1\n0000000000 65535 f\r\n") #Readers expect the section to start at object 0.
+    for idnum, (offset, generation) in sorted(offsets.items()):
+        #One subsection per object keeps it simple, they're allowed to be a single entry long.
+        update.write(f"{idnum} 1\n{offset:010d} {generation:05d} n\r\n".encode())
+    update.write(b"trailer\n")
+    trailer.writeToStream(update, None)
+    update.write(f"\nstartxref\n{xref}\n%%EOF\n".encode())
+
+    with open(fileName, "ab") as file:
+        file.write(update.getvalue())
+        file.flush()
+        os.fsync(file.fileno())
+    return True
+
 class PlayerCharacter(object):
     """
     Class to hold the stats and character sheet information of a player charater.
     Takes a file name to load and populate the class with the information. Saves that
     file and allows the class to be updated from it again later.
+    If the sheet was already parsed, say in another process, its to_data() can be given as data to skip the parse.
+
+    The stats themselves live in a row of a StatStore, the Group's once the player is added to one.
+    chars, skills, dynamics and general read back as fresh dicts of the row, so change stats with
+    change() or by assigning the whole dict, not by editing what they return.
+
+    Given a backend, a store.SheetBackend, the player is saved there instead of to the PDF, which
+    is then only written by export_pdf().
     """
-    def __init__(self, fileName) -> None:
+    __slots__ = ('fileName', 'name', 'fullName', 'store', 'row', 'lock', 'writtenHash', 'dirty',
+        'journal', 'backend', '__saved__', '__talents__')
+
+    def __init__(self, fileName, data = None, backend = None) -> None:
         self.fileName = fileName
-        self.update()
+        self.backend = backend
+        self.journal = Journal() #Only in memory until open_journal()
+        self.store = new_store()
+        self.row = self.store.add_row()
+        self.lock = RLock() #Held while changing or saving, the SaveWorker saves from its own thread.
+        self.writtenHash = None #Hash of the file as we last saved it, to tell our own writes from someone else's.
+        if data == None:
+            self.update()
+        else:
+            self.from_data(data)
+
+    @property
+    def chars(self) -> dict:
+        return dict(zip(CHAR_NAMES, self.store.get('chars', self.row).tolist()))
+
+    @chars.setter
+    def chars(self, chars: dict) -> None:
+        self.store.set('chars', self.row, [chars[name] for name in CHAR_NAMES])
+
+    @property
+    def skills(self) -> dict:
+        return dict(zip(SKILL_NAMES, self.store.get('skills', self.row).tolist()))
+
+    @skills.setter
+    def skills(self, skills: dict) -> None:
+        self.store.set('skills', self.row, [skills[name] for name in SKILL_NAMES])
+
+    @property
+    def dynamics(self) -> dict:
+        return dict(zip(DYNAMIC_NAMES, self.store.get('dynamics', self.row).tolist()))
+
+    @dynamics.setter
+    def dynamics(self, dynamics: dict) -> None:
+        self.store.set('dynamics', self.row, [dynamics[name] for name in DYNAMIC_NAMES])
+
+    @property
+    def general(self) -> dict:
+        return dict(zip(GENERAL_NAMES, self.store.get('general', self.row).tolist()))
+
+    @general.setter
+    def general(self, general: dict) -> None:
+        self.store.set('general', self.row, [general[name] for name in GENERAL_NAMES])
+
+    @property
+    def availableXp(self) -> int:
+        return int(self.store['xp'][self.row, XP_NAMES.index('availableXp')])
+
+    @availableXp.setter
+    def availableXp(self, value: int) -> None:
+        self.store.set('xp', self.row, value, (XP_NAMES.index('availableXp'),))
+
+    @property
+    def totalXp(self) -> int:
+        return int(self.store['xp'][self.row, XP_NAMES.index('totalXp')])
+
+    @totalXp.setter
+    def totalXp(self, value: int) -> None:
+        self.store.set('xp', self.row, value, (XP_NAMES.index('totalXp'),))
+
+    def move_to(self, store: StatStore) -> None:
+        """
+        Move this player's stats into a row of another StatStore, like when it joins a Group.
+        """
+        with self.lock:
+            values = {column : self.store.get(column, self.row) for column in STORE_COLUMNS}
+            row = store.add_row()
+            store.set_row(row, values)
+            self.store.remove_row(self.row)
+            self.store = store
+            self.row = row
 
     def __read_value__(self, data: dict) -> int:
         """
@@ -100,12 +500,13 @@ class PlayerCharacter(object):
         Characteristics are easy because we can grab them by the key name in
         the data dict, and save them by the same name. (Except the saved key is all lowercase for ease.)
         """
-        self.chars = dict() #Clear it because we are reloading.
+        chars = dict()
         for charName in CHARS: #Defined at the begining of the file, list of strings.
             try:
-                self.chars[charName.lower()] = characteristic(self.__read_value__(data[charName])) #Convert string to our int type
+                chars[charName.lower()] = characteristic(self.__read_value__(data[charName])) #Convert string to our int type
             except:
                 raise PlayerError(f"Error loading {charName} in {self.fileName}")
+        self.chars = chars
 
     def __load_dynams__(self, data) -> None:
         """
@@ -119,16 +520,14 @@ class PlayerCharacter(object):
         and put them into our own list type 'dynamic', with the threshold first
         and the current count second.
         """
-        self.dynamics = dict()
+        dynamics = dict()
         try:
-            self.dynamics['wounds'] = dynamic([self.__read_value__(data['WT']),
-                self.__read_value__(data['WT Current'])])
-            self.dynamics['strain'] = dynamic([self.__read_value__(data['ST']),
-                self.__read_value__(data['ST Current'])])
-            self.dynamics['encumbrance'] = dynamic([self.__read_value__(data['Worn / Generally Carried Encumberance Threshold']),
-                self.__read_value__(data['Worn / Generally Carried Encumberance Current'])])
+            for name, (threshold, current) in DYNAMICS.items():
+                dynamics[name] = dynamic([self.__read_value__(data[threshold]),
+                    self.__read_value__(data[current])])
         except:
             raise PlayerError(f"Error loading dynamics in {self.fileName}")
+        self.dynamics = dynamics
 
     def __load_abilities__(self, data, pdf):
         """
@@ -148,13 +547,13 @@ class PlayerCharacter(object):
         Additionally, the pro and ability dice seem to be in different orders depending
         on which die exists or if there are both...
         """
-        self.skills = dict()
+        skills = dict()
         try:
             for skillName in SKILLS:
                 newSkill = skill([0] * 3) #Fill it with blank spaces so we can assign the spaces out of order (range)
                 kids = data[skillName]['/Kids'] #Grabs a list of the indirect objects
                 for kid in kids:
-                    obj = pdf.getObject(kid)
+                    obj = kid.getObject() #Already resolved by read_fields(), but an IndirectObject works too
                     if obj['/T'] == 'Proficiency':
                         if '/V' in obj: #Can't use get, because defaulting would create length.
                             newSkill[1] = len(obj['/V']) #It has dice, so how many?
@@ -168,13 +567,14 @@ class PlayerCharacter(object):
                     else: #If it's not pro or ability it's one of the rank checkboxes
                         if '/V' in obj and obj['/V'] == '/Yes':
                             newSkill[0] += 1 #For every box found checked increase rank by 1
-                self.skills[skillName.lower()] = newSkill #This skill is finished, add it, all lowercase
+                skills[skillName.lower()] = newSkill #This skill is finished, add it, all lowercase
         except:
             raise PlayerError(f"Error while parsing abilities in {self.fileName}")
+        self.skills = skills
 
     def __load_talents__(self, data) -> None:
-        self.talents = list()
-        for i in range(1, 37):
+        self.__talents__ = list()
+        for i in range(1, TALENT_SLOTS + 1):
             newTalent = Talent()
             if '/V' not in data[f"Character Talents Name {i}"]:
                 continue
@@ -188,7 +588,34 @@ class PlayerCharacter(object):
             except ValueError: #If it's not a int, just give it rank 1 as a default
                 newTalent.rank = 1
             newTalent.description = data[f"Character Talents Description {i}"]['/V']
-            self.talents.append(newTalent)
+            self.__talents__.append(newTalent)
+
+    @property
+    def talents(self) -> list:
+        """
+        Talents are rarely used, so they aren't loaded with the rest of the sheet but on first use.
+        From the SheetCache if the sheet hasn't changed, otherwise straight from the PDF.
+        """
+        if self.__talents__ == None:
+            cache = SheetCache.for_sheet(self.fileName)
+            talents = cache.get(self.fileName, 'talents')
+            if talents == None:
+                try:
+                    before = fingerprint(self.fileName)
+                except FileNotFoundError:
+                    raise PlayerError(f"Can't find file: {self.fileName}")
+                try:
+                    with open(self.fileName, "rb") as file:
+                        self.__load_talents__(read_fields(PdfFileReader(file), TALENT_PLAN))
+                except KeyError:
+                    raise PlayerError(f"Error loading talents in: {self.fileName}")
+                cache.put(self.fileName, self.__talent_data__(), before, 'talents')
+            else:
+                self.__talents__ = [Talent(*talent) for talent in talents]
+        return self.__talents__
+
+    def __talent_data__(self) -> list:
+        return [[talent.name, talent.rank, talent.description] for talent in self.__talents__]
 
     def __getChangedStr__(self, item, value, old, new) -> str:
         """
@@ -204,24 +631,48 @@ class PlayerCharacter(object):
             changed = f"{self.name}'s {item} decreased from {old} to {new}" 
         return changed
 
-    def update(self, fileName = None) -> None:
+    def update(self, fileName = None, useCache = True) -> None:
         """
         Parse the file and populate the character's information.
         Recieves a filename if we need to switch to a new file to load,
         otherwise it loads the file that we parsed when we initiated the class.
+        Unless useCache is False an unchanged file is loaded from the SheetCache instead of parsed again.
+        A player kept in a backend is reloaded from there instead, unless a new file is given.
         """
+        if fileName == None and self.backend != None:
+            self.from_data(self.backend.get(self.name)[1])
+            self.journal.clear()
+            return
         if fileName == None:
             fileName = self.fileName
         #Otherwise new filename was given so reload the player from a new file
+        cache = SheetCache.for_sheet(fileName)
+        data = cache.get(fileName) if useCache else None
+        if data == None:
+            try:
+                before = fingerprint(fileName)
+            except FileNotFoundError:
+                raise PlayerError(f"Can't find file: {fileName}")
+            self.__parse__(fileName)
+            cache.put(fileName, self.to_data(), before)
+        else:
+            self.from_data(data)
+
+        self.journal.clear()
+
+    def __parse__(self, fileName) -> None:
+        """
+        Read every stat out of the PDF fields of fileName.
+        """
         try:
             file = open(fileName, "rb")
         except FileNotFoundError:
             raise PlayerError(f"Can't find file: {fileName}")
         try:
             pdf = PdfFileReader(file)
-            #Load the data. This returns a dict of dicts.
+            #Load the data. This returns a dict of dicts, like getFields() but only the fields in FIELD_PLAN.
             #   See fields.txt for example data.
-            data = pdf.getFields()
+            data = read_fields(pdf)
             #Not everyone has a single name like Moddona...
             self.fullName = data['Name']['/V']
             name = data['Name']['/V'].split()[0]
@@ -238,12 +689,13 @@ class PlayerCharacter(object):
 
             #Save basic number stats in a dict named general. These can be found using
             #   lookup_stat and change, so only include viable stats.
-            self.general = dict()
-            self.general['credits'] = self.__read_value__(data['Personal Finances Available Credits'])
-            self.general['duty'] = self.__read_value__(data['Total Duty'])
+            general = dict()
+            for name, field in GENERAL.items():
+                general[name] = self.__read_value__(data[field])
+            self.general = general
 
-            self.availableXp = self.__read_value__(data['Available XP'])
-            self.totalXp = self.__read_value__(data['Total XP'])
+            self.availableXp = self.__read_value__(data[XP['availableXp']])
+            self.totalXp = self.__read_value__(data[XP['totalXp']])
             
         except KeyError:
             raise PlayerError(f"Error loading general data in: {fileName}")
@@ -253,16 +705,128 @@ class PlayerCharacter(object):
         self.__load_chars__(data)
         self.__load_dynams__(data)
         self.__load_abilities__(data, pdf)
-        self.__load_talents__(data)
+        self.__talents__ = None #Reloaded on next use
+        self.__saved__ = self.saved_values()
+        self.dirty = set()
 
         file.close()
 
-        self.changeLog = list()
+    def replace_data(self, data: dict) -> bool:
+        """
+        Swap in freshly parsed data, a to_data(), for the sheet. Every stat changes in one step,
+        so a command on another thread sees all the old stats or all the new ones, never a mix.
+        Returns False, changing nothing, if there are unsaved changes that would be lost.
+        """
+        with self.lock:
+            if self.is_dirty:
+                return False
+            with self.store.lock: #Readers go through the store's lock, so they see none of it until it's all done.
+                self.from_data(data)
+            self.journal.clear()
+            self.writtenHash = None
+            return True
 
-    def save(self) -> str:
+    def to_data(self, withTalents = False) -> dict:
         """
-        
+        Returns everything loaded from the sheet as plain dicts and lists, for caching or sending between processes.
+        Talents are only included if withTalents is True, which loads them if they aren't yet.
+        """
+        data = {
+            'fullName' : self.fullName,
+            'name' : self.name,
+            'general' : self.general,
+            'availableXp' : self.availableXp,
+            'totalXp' : self.totalXp,
+            'chars' : self.chars,
+            'dynamics' : self.dynamics,
+            'skills' : self.skills}
+        if withTalents:
+            self.talents #Loads them if they are not yet
+            data['talents'] = self.__talent_data__()
+        return data
+
+    def from_data(self, data: dict) -> None:
+        """
+        Load the character from the dict made by to_data() instead of the PDF.
         """
+        self.fullName = data['fullName']
+        self.name = data['name']
+        try:
+            self.store.set_row(self.row, store_row(data))
+        except (KeyError, ValueError):
+            raise PlayerError(f"Error loading the stats of {self.fileName}")
+        if 'talents' in data:
+            self.__talents__ = [Talent(*talent) for talent in data['talents']]
+        else:
+            self.__talents__ = None
+        self.__saved__ = self.saved_values()
+        self.dirty = set()
+
+    def saved_values(self) -> dict:
+        """
+        Returns the current value of every field save() writes, as the str that goes in the PDF.
+        """
+        return {field : str(value(self)) for field, value in SAVED_FIELDS.items()}
+
+    @property
+    def is_dirty(self) -> bool:
+        """True if change() touched a saved field since the sheet was loaded or last saved."""
+        return len(self.dirty) > 0
+
+    def changed_fields(self) -> dict:
+        """
+        Returns the fields, and their new values, that changed since the sheet was loaded or last saved.
+        A field changed and then changed back isn't included.
+        """
+        return {field : value for field, value in self.saved_values().items() if self.__saved__.get(field) != value}
+
+    def save(self, incremental = True) -> str:
+        """
+        Write the changed stats back to the PDF and return the file saved to.
+        By default only the fields that changed are appended to the end of the sheet as a PDF
+        incremental update, so the save costs about the size of the change and the earlier
+        version stays inside the file. If the PDF can't take one, or incremental is False,
+        the whole sheet is rewritten and the old one kept as '[name].bkp'.
+        A player with a backend is saved there instead, and the PDF left alone.
+        """
+        with self.lock:
+            if self.backend != None:
+                self.talents #Loaded first, so the store isn't held up while they're read from the PDF
+            #One snapshot, so what's written and what's remembered as saved are the same values.
+            with self.store.lock:
+                values = self.saved_values()
+                data = self.to_data(withTalents=True) if self.backend != None else None
+            if self.backend != None:
+                self.backend.put(data, self.fileName)
+                saved = self.backend.describe(self.name)
+            else:
+                changed = {field : value for field, value in values.items() if self.__saved__.get(field) != value}
+                saved = self.__write_pdf__(changed, incremental)
+            self.__saved__ = values
+            self.dirty = set()
+            self.journal.clear()
+            return saved
+
+    def export_pdf(self, incremental = True) -> str:
+        """
+        Write every saved field to the PDF, whether it changed or not, and return the file written.
+        For regenerating the PDF of a player kept in a backend.
+        """
+        with self.lock:
+            return self.__write_pdf__(self.saved_values(), incremental)
+
+    def __write_pdf__(self, fields: dict, incremental) -> str:
+        """
+        Write fields, a dict of field name to value, to the PDF. See save().
+        """
+        if incremental:
+            try:
+                done = append_field_update(self.fileName, fields)
+            except OSError:
+                raise PlayerError(f"Error: Cannot write to {self.fileName}")
+            if done:
+                self.writtenHash = file_hash(self.fileName)
+                return str(self.fileName)
 
         def set_need_appearances_writer(writer: PdfFileWriter):
             # See 12.7.2 and 7.7.2 for more information: http://www.adobe.com/content/dam/acom/en/devnet/acrobat/pdfs/PDF32000_2008.pdf
@@ -319,8 +883,8 @@ class PlayerCharacter(object):
         self.fileName.replace(newPath.with_suffix('.bkp'))
         #Change file extension of new temp file.
         tmpPath.replace(newPath)
-
-        self.changelog = list()
+        self.fileName = newPath
+        self.writtenHash = file_hash(self.fileName)
 
         return str(newPath)
     
@@ -328,23 +892,16 @@ class PlayerCharacter(object):
         """
         Tries to find the stat given by name and return it's value as a formatted string
         """
-        name = name.lower()
-        if name in self.chars.keys():
-            stat = self.chars[name]
+        found = resolve_stat(name)
+        name = found.name
+        stat = found.value(self)
+        if found.kind == 'char' or found.kind == 'general':
             return f"{self.name}'s {name} is: {stat!s}"
-        if name in self.dynamics.keys():
-            stat = self.dynamics[name]
+        if found.kind == 'dynamic':
             return f"{self.name}'s {name} is:\nThreshold: {stat[0]!s}\nCurrent: {stat[1]!s}"
-        if name in self.skills.keys():
-            stat = self.skills[name]
+        if found.kind == 'skill':
             return f"{self.name}'s {name} is:\nRank: {stat[0]}\nProfficiency: {stat[1]}\nAbility: {stat[2]}"
-        if name in self.general.keys():
-            stat = self.general[name]
-            return f"{self.name}'s {name} is: {stat!s}"
-        if name == 'xp' or name == 'exp':
-            return f"{self.name}'s Available XP is {self.availableXp}, with a total XP of {self.totalXp}"
-        #If we got this far the stat it was asked us to find does not exist.
-        raise PlayerError(f"Unable to find stat named {name!r}")
+        return f"{self.name}'s Available XP is {self.availableXp}, with a total XP of {self.totalXp}"
 
     def get_talents(self, index = None):
         """
@@ -394,45 +951,144 @@ class PlayerCharacter(object):
         """
         Returns a list of haw many dice to roll for a certain stat [pro, ability]
         """
-        skill = skill.lower()
-        if skill not in self.skills.keys():
+        stat = resolve_stat(skill)
+        if stat.kind != 'skill':
             raise PlayerError(f"No such skill: {skill}")
-        return [self.skills[skill][1], self.skills[skill][2]]
+        return stat.value(self)[1:]
 
     def change(self, item: str, value: int) -> str:
-        item = item.lower()
-        
-        if item in self.dynamics.keys():
-            oldValue = self.dynamics[item][1]
-            self.dynamics[item][1] += value
-            if self.dynamics[item][1] < 0:
-                self.dynamics[item][1] = 0
-            timestamp = strftime("%I:%M:%S | ", localtime())
-            record = self.__getChangedStr__(item, value, oldValue, self.dynamics[item][1])
-            self.changeLog.insert(0, timestamp + record)
-            return record
-        if item in self.general.keys():
-            oldValue = self.general[item]
-            self.general[item] += value
-            timestamp = strftime("%I:%M:%S | ", localtime())
-            record = self.__getChangedStr__(item, value, oldValue, self.general[item])
-            self.changeLog.insert(0, timestamp + record)
-            return record
-        if item == 'xp' or item == 'exp':
-            oldAvailXp = self.availableXp
-            oldTotalXp = self.totalXp
-            self.totalXp += value
-            self.availableXp += value
-            timestamp = strftime("%I:%M:%S | ", localtime())
-            record = self.__getChangedStr__('Availible XP', value, oldAvailXp, self.availableXp)
-            record2 = self.__getChangedStr__('Total XP', value, oldTotalXp, self.totalXp)
-            record += '\n'
-            record += record2
-            self.changeLog.insert(0, timestamp + record)
-            return record
-
-        raise PlayerError(f"Unknown, or unable to change {item} for {self.name}... Stopping...")     
-    
+        """
+        Change a stat by value and return a description of the change. The change is journaled
+        and the saved fields it touches are marked dirty, see CHANGED_FIELDS.
+        """
+        return change_stat([self], item, value)[0]
+
+    def open_journal(self, folder: Path) -> int:
+        """
+        Keep the journal in folder as '[name].jsonl' from now on, so changes survive the bot
+        stopping before they're saved. Changes left in it by a run that never saved them are
+        replayed on top of the sheet as loaded, and how many there were is returned.
+        """
+        journal = Journal(Path(folder) / f"{self.name}.jsonl")
+        with self.lock:
+            for entry in journal.entries:
+                label, column, index = JOURNAL_STATS[entry.stat]
+                self.store.set(column, self.row, entry.new, index)
+                self.dirty.update(CHANGED_FIELDS[entry.stat])
+            self.journal.close()
+            self.journal = journal
+        return len(journal)
+
+    def get_changelog(self, page = 1) -> str:
+        """
+        Returns a page, counted from 1, of the changes made since the last save, newest first.
+        """
+        entries, pages = self.journal.page(page, CHANGELOG_PAGE)
+        if page < 1 or page > pages:
+            raise PlayerError(f"No page {page}, {self.name}'s changelog has {pages}")
+        message = str()
+        for entry in entries:
+            timestamp = strftime("%I:%M:%S | ", localtime(entry.time))
+            message += timestamp + self.__getChangedStr__(JOURNAL_STATS[entry.stat][0], entry.delta, entry.old, entry.new) + '\n'
+        if pages > 1:
+            message += f"\nPage {page} of {pages}"
+        return message
+
+def change_stat(players: list, item: str, value: int) -> list:
+    """
+    Change a stat by value for every one of players, as one operation on each StatStore column it
+    lives in. Players sharing a store, like a Group's, are changed together. Returns the description
+    of each player's change, logged and marked dirty like PlayerCharacter.change().
+    """
+    changed = change_stats([(players, item, value)])
+    return [changed[player] for player in players]
+
+def change_stats(changes: list) -> dict:
+    """
+    Make a batch of changes as one transaction. changes is a list of (players, stat, value), each
+    adding value to that stat of every one of players. Every stat and value is checked before
+    anything is changed, then the lot is made holding the lock of each store involved, so nothing
+    else sees it half done. If one would still take a stat out of range the ones already made are
+    undone, so it all happens or none of it does. Each player's changes go in their journal in one append.
+    Returns a dict of each player changed, in the order first given, to the description of all
+    of their changes.
+    """
+    resolved = list()
+    for players, item, value in changes:
+        stat = resolve_stat(item).name
+        if stat not in CHANGES:
+            raise PlayerError(f"Unknown, or unable to change {stat}... Stopping...")
+        if value == 0:
+            raise PlayerError("Can't change stat by 0")
+        if abs(value) > CHANGE_LIMIT:
+            raise PlayerError(f"Can't change {stat} by more than {CHANGE_LIMIT:,} at once")
+        resolved.append((players, stat, value))
+    records = dict() #Player to the descriptions of their changes
+    entries = dict() #Player to their journal entries
+    for players, stat, value in resolved:
+        for player in players:
+            records.setdefault(player, list())
+            entries.setdefault(player, list())
+    now = time()
+    with ExitStack() as held:
+        #Each player's lock is held until they're journaled and marked dirty, so a save() can't come
+        #   in between and clear the journal of a change it never wrote. Players are locked before
+        #   stores, like save() does, and in the same order every time, so nothing can deadlock.
+        for player in sorted(records, key=id):
+            held.enter_context(player.lock)
+        stores = {id(player.store) : player.store for player in records} #Can't move store now they're locked
+        for key in sorted(stores):
+            held.enter_context(stores[key].lock)
+        made = list() #(store, column, rows, index, old values) of each change made, to undo them
+        for players, item, value in resolved:
+            byStore = dict() #id of each store to the players in it
+            for player in players:
+                byStore.setdefault(id(player.store), list()).append(player)
+            for group in byStore.values():
+                store = group[0].store
+                rows = [player.row for player in group]
+                for stat, label, column, index, floor in CHANGES[item]:
+                    try:
+                        old, new = store.add(column, rows, index, value, floor)
+                    except OverflowError:
+                        for store, column, rows, index, old in reversed(made):
+                            for row, oldValue in zip(rows, old.tolist()):
+                                store.set(column, row, oldValue, index)
+                        raise PlayerError(f"Can't change {label} by {value}, it would be too far out of range. Nothing was changed")
+                    made.append((store, column, rows, index, old))
+                    for player, oldValue, newValue in zip(group, old.tolist(), new.tolist()):
+                        records[player].append(player.__getChangedStr__(label, value, oldValue, newValue))
+                        entries[player].append(Entry(now, stat, value, oldValue, newValue))
+        for player, changed in entries.items():
+            for entry in changed: #Dirty first, so it's still saved if the journal can't be written
+                player.dirty.update(CHANGED_FIELDS[entry.stat])
+            player.journal.append(changed)
+    return {player : '\n'.join(lines) for player, lines in records.items()}
+
+def read_sheet(fileName) -> dict:
+    """
+    Parse a sheet and return its to_data(). Lives at module level so a ProcessPoolExecutor can run it.
+    """
+    return PlayerCharacter(fileName).to_data()
+
+def load_sheets(files: list) -> dict:
+    """
+    Parse many sheets at once, fanned out over a process pool since the PDF parsing is CPU bound.
+    Returns a dict of each file to its new PlayerCharacter, or to the PlayerError it failed with.
+    """
+    executor = get_executor()
+    results = dict()
+    futures = {executor.submit(read_sheet, file) : file for file in files}
+    for future in as_completed(futures):
+        file = futures[future]
+        try:
+            results[file] = PlayerCharacter(file, future.result())
+        except PlayerError as err:
+            results[file] = err
+        except Exception as err: #Anything else PyPDF2 throws at us on a broken file
+            results[file] = PlayerError(f"Error loading {file}: {err!r}")
+    return results
+
 class NonPlayerCharater(object):
     """
     Class to (eventually) hold the stats and character sheet information of a non player charater.
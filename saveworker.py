@@ -0,0 +1,100 @@
+"""
+Droid Bot Assistant > saveworker.py | Background thread that saves changed character sheets.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from threading import Thread, Condition, Lock
+from time import monotonic
+import logging
+
+from player import PlayerCharacter, PlayerError
+
+logger = logging.getLogger(__name__)
+
+class SaveWorker(Thread):
+    """
+    Write behind saving for PlayerCharacters. Commands call mark() after changing a player and
+    carry on, and once a player has gone delay seconds without another mark() this thread saves
+    them. A burst of /modify and /modifyall costs one save per player, and the PDF writes stay
+    off the command path. flush() saves anything waiting right away, for /stop and shutdown.
+    """
+    def __init__(self, delay = 5.0) -> None:
+        super().__init__(name='SaveWorker', daemon=True)
+        self.delay = delay
+        self.pending = dict() #PlayerCharacter to the time it's due to be saved
+        self.condition = Condition()
+        self.saving = Lock() #So flush() and the thread never save at the same time
+        self.stopped = False
+
+    def mark(self, *players: PlayerCharacter) -> None:
+        """
+        Queue players to be saved, pushing their save back if they were already waiting.
+        """
+        with self.condition:
+            due = monotonic() + self.delay
+            for player in players:
+                self.pending[player] = due
+            self.condition.notify()
+
+    def run(self) -> None:
+        with self.condition:
+            while not self.stopped:
+                if len(self.pending) == 0:
+                    self.condition.wait()
+                    continue
+                wait = min(self.pending.values()) - monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                now = monotonic()
+                due = [player for player, time in self.pending.items() if time <= now]
+                for player in due:
+                    del self.pending[player]
+                #Don't hold the condition while writing, so mark() never waits on a save.
+                self.condition.release()
+                try:
+                    self.__save__(due)
+                finally:
+                    self.condition.acquire()
+
+    def __save__(self, players: list) -> list:
+        """
+        Save every player that still has unsaved changes and return the files written.
+        A player that fails, however it fails, is logged and skipped, the rest are still saved.
+        """
+        saved = list()
+        with self.saving:
+            for player in players:
+                if not player.is_dirty:
+                    continue
+                try:
+                    saved.append(player.save())
+                except (PlayerError, OSError) as err:
+                    logger.error(f"Couldn't save {player.name}: {err}")
+                except Exception: #Anything else PyPDF2 throws at us mustn't kill the thread or the command flushing
+                    logger.exception(f"Failed saving {player.name}")
+        return saved
+
+    def flush(self, players = None) -> list:
+        """
+        Save now, in this thread, whatever is waiting. Give players to only flush those.
+        Returns the files written.
+        """
+        with self.condition:
+            if players == None:
+                players = list(self.pending)
+            for player in players:
+                self.pending.pop(player, None)
+        return self.__save__(players)
+
+    def stop(self) -> list:
+        """
+        Flush everything and end the thread.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        return self.flush()
@@ -0,0 +1,218 @@
+"""
+Droid Bot Assistant > sessions.py | Keeps a Group per chat, snapshotting idle ones to disk.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from threading import RLock
+import json
+import logging
+import os
+
+from player import PlayerError, PlayerCharacter
+from group import Group, TokenPool
+from sheetcache import file_hash
+
+logger = logging.getLogger(__name__)
+
+def entry_name(entry: dict) -> str:
+    """The name of the player a snapshot's entry is for."""
+    return entry['name'] if 'name' in entry else entry['sheet']['name']
+
+class SessionRegistry(object):
+    """
+    Every chat's table, a Group of its own with its players and destiny TokenPool, keyed by chat id.
+    Only so many players are kept in memory across all the chats, budget of them. Past that the
+    least recently used sessions are evicted to a small JSON snapshot in folder, '[chat id].json',
+    and rebuilt from it the next time their chat uses them. Snapshots outlive the bot, so the
+    tables are still there after a restart.
+
+    evicting(group) is called before a session is snapshotted, to save and close its players, and
+    restored(group) after one is rebuilt, to pick them back up. Given a backend, a store.SheetBackend,
+    players are reloaded from it. Otherwise a player whose PDF hasn't changed since is rebuilt from
+    the snapshot, and one whose has is parsed again.
+
+    A character can only be loaded in one chat at a time, see add_player(), as their journal and
+    their sheet are shared by every chat that loads them.
+    """
+    def __init__(self, folder: Path, budget = 64, backend = None, evicting = None, restored = None) -> None:
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.budget = budget
+        self.backend = backend
+        self.evicting = evicting
+        self.restored = restored
+        self.lock = RLock() #Commands and the SheetWatcher's thread both come through here
+        self.sessions = OrderedDict() #Chat id to its Group, least recently used first
+        self.evicted = dict() #Chat id to the names of the players in its snapshot
+        for path in self.folder.glob('*.json'):
+            try:
+                with open(path) as file:
+                    self.evicted[int(path.stem)] = {entry_name(entry) for entry in json.load(file)['players']}
+            except (ValueError, KeyError, OSError) as err:
+                logger.warning(f"Couldn't read the players of {path}: {err}")
+
+    def __path__(self, chatId: int) -> Path:
+        return self.folder / f"{int(chatId)}.json"
+
+    def get(self, chatId: int) -> Group:
+        """
+        Returns the chat's Group, rebuilding it if it was evicted, and marks it as just used.
+        Raises KeyError('group') if the chat has none, which the bot answers with 'Try /start'.
+        """
+        with self.lock:
+            group = self.__load__(chatId)
+            self.sessions.move_to_end(chatId)
+            self.__trim__(chatId)
+            return group
+
+    def __load__(self, chatId: int) -> Group:
+        group = self.sessions.get(chatId)
+        if group == None:
+            path = self.__path__(chatId)
+            if not path.exists():
+                raise KeyError('group')
+            self.evicted.pop(chatId, None)
+            group = self.__rehydrate__(chatId, path)
+            self.sessions[chatId] = group
+        return group
+
+    def start(self, chatId: int) -> Group:
+        """
+        Give the chat a new, empty Group, dropping any it had. Anything to be kept of the old one
+        should be saved with stop() first.
+        """
+        with self.lock:
+            self.sessions[chatId] = Group()
+            self.sessions.move_to_end(chatId)
+            self.evicted.pop(chatId, None)
+            self.__path__(chatId).unlink(missing_ok=True)
+            return self.sessions[chatId]
+
+    def stop(self, chatId: int):
+        """
+        Forget the chat's Group, in memory and on disk, and return it, or None if it had none.
+        """
+        with self.lock:
+            try:
+                group = self.__load__(chatId) #Brought back just to be saved, so no need to make room
+            except KeyError:
+                return None
+            del self.sessions[chatId]
+            self.__path__(chatId).unlink(missing_ok=True)
+            return group
+
+    def owner(self, name: str):
+        """
+        Returns the id of the chat the player called name is loaded in, in memory or snapshotted, or None.
+        """
+        with self.lock:
+            for chatId, group in self.sessions.items():
+                if any(player.name == name for player in group.get_players()):
+                    return chatId
+            for chatId, names in self.evicted.items():
+                if name in names:
+                    return chatId
+            return None
+
+    def add_player(self, chatId: int, player: PlayerCharacter) -> None:
+        """
+        Add player to the chat's Group. Raises PlayerError if they're already loaded in another chat,
+        since the two would replay and clear each other's journal and overwrite each other's saves.
+        """
+        with self.lock:
+            owner = self.owner(player.name)
+            if owner != None and owner != chatId:
+                raise PlayerError(f"{player.name} is already loaded in another chat. /unload them there first.")
+            self.get(chatId).add_player(player)
+
+    def groups(self) -> list:
+        """Every Group in memory right now."""
+        with self.lock:
+            return list(self.sessions.values())
+
+    def __players__(self) -> int:
+        return sum(len(group.get_players()) for group in self.sessions.values())
+
+    def __trim__(self, keep: int) -> None:
+        """
+        Evict the least recently used sessions, other than keep's, until we're within budget.
+        """
+        for chatId in list(self.sessions):
+            if self.__players__() <= self.budget:
+                return
+            if chatId != keep:
+                self.__evict__(chatId)
+
+    def __evict__(self, chatId: int) -> None:
+        group = self.sessions[chatId]
+        if self.evicting != None:
+            self.evicting(group)
+        players = list()
+        for player in group.get_players():
+            if self.backend != None:
+                players.append({'name' : player.name})
+                continue
+            try:
+                sheetHash = file_hash(player.fileName)
+            except OSError:
+                sheetHash = None
+            players.append({'file' : str(player.fileName), 'hash' : sheetHash, 'sheet' : player.to_data()})
+        snapshot = {'players' : players, 'destiny' : group.destiny.to_data()}
+        path = self.__path__(chatId)
+        tmpPath = path.with_suffix('.tmp')
+        try:
+            with open(tmpPath, 'w') as file:
+                json.dump(snapshot, file, separators=(',', ':'))
+                file.flush()
+                os.fsync(file.fileno())
+            tmpPath.replace(path)
+        except OSError as err:
+            logger.error(f"Couldn't snapshot chat {chatId}, keeping it in memory: {err}")
+            return
+        del self.sessions[chatId]
+        self.evicted[chatId] = {entry_name(entry) for entry in players}
+        logger.info(f"Evicted chat {chatId} with {len(players)} players to {path}")
+
+    def __rehydrate__(self, chatId: int, path: Path) -> Group:
+        try:
+            with open(path) as file:
+                snapshot = json.load(file)
+        except ValueError:
+            raise PlayerError(f"This chat's saved session {path} is corrupt. Try /start")
+        group = Group()
+        group.destiny = TokenPool.from_data(snapshot['destiny'])
+        for entry in snapshot['players']:
+            owner = self.owner(entry_name(entry))
+            if owner != None:
+                logger.warning(f"Not restoring {entry_name(entry)} of {path}, they are loaded in chat {owner} too")
+                continue
+            try: #One sheet gone missing shouldn't cost the chat the rest of its table
+                if 'name' in entry:
+                    player = self.backend.load(entry['name'])
+                else:
+                    file = Path(entry['file'])
+                    try:
+                        unchanged = entry['hash'] != None and file_hash(file) == entry['hash']
+                    except OSError:
+                        unchanged = False
+                    player = PlayerCharacter(file, entry['sheet'] if unchanged else None)
+                group.add_player(player)
+            except PlayerError as err:
+                logger.warning(f"Couldn't restore a player of {path}: {err}")
+        if self.restored != None:
+            self.restored(group)
+        logger.info(f"Restored {len(group.get_players())} players from {path}")
+        return group
+
+    def close(self) -> None:
+        """
+        Snapshot every session, so they're all picked up again next run.
+        """
+        with self.lock:
+            for chatId in list(self.sessions):
+                self.__evict__(chatId)
@@ -0,0 +1,108 @@
+"""
+Droid Bot Assistant > sheetcache.py | Cache of parsed character sheets so unchanged PDFs aren't parsed again.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from pathlib import Path
+from hashlib import sha256
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+def cache_folder(sheet: Path) -> Path:
+    """
+    The cache lives next to the character folder, so 'characters/' gets 'characters.cache/'.
+    """
+    folder = Path(sheet).resolve().parent
+    return folder.parent / f"{folder.name or 'characters'}.cache"
+
+def file_hash(path: Path) -> str:
+    with open(path, 'rb') as file:
+        return sha256(file.read()).hexdigest()
+
+def fingerprint(sheet: Path) -> dict:
+    """
+    Returns the path, modified time, size and content hash a cache entry is keyed on.
+    """
+    sheet = Path(sheet).resolve()
+    info = sheet.stat()
+    return {'path' : str(sheet), 'mtime' : info.st_mtime_ns, 'size' : info.st_size, 'hash' : file_hash(sheet)}
+
+class SheetCache(object):
+    """
+    Keeps the parsed data of each character sheet in a small JSON file, keyed on the sheet's
+    path, modified time, size and content hash. If the path, time and size all match the data is
+    used as is. If only the time changed the content hash decides, so touching a file doesn't
+    cost a parse. Anything else and the entry is stale and get() gives None.
+    """
+    def __init__(self, folder: Path) -> None:
+        self.folder = Path(folder)
+
+    @classmethod
+    def for_sheet(cls, sheet: Path) -> 'SheetCache':
+        return cls(cache_folder(sheet))
+
+    def __entry_path__(self, sheet: Path) -> Path:
+        return self.folder / f"{Path(sheet).stem}.json"
+
+    def get(self, sheet: Path, section = 'core'):
+        """
+        Returns the cached data for a section of the sheet, or None if there is none or it is stale.
+        Sections are parsed and cached seperately so the rarely used ones, like talents, can wait.
+        """
+        sheet = Path(sheet).resolve()
+        try:
+            with open(self.__entry_path__(sheet)) as file:
+                entry = json.load(file)
+            info = sheet.stat()
+        except (OSError, ValueError):
+            return None
+        if entry.get('path') != str(sheet) or entry.get('size') != info.st_size or section not in entry:
+            return None
+        if entry.get('mtime') != info.st_mtime_ns:
+            if entry.get('hash') != file_hash(sheet):
+                return None
+            entry['mtime'] = info.st_mtime_ns #Same contents, just touched. Remember the new time.
+            self.__write__(sheet, entry)
+        return entry[section]
+
+    def put(self, sheet: Path, data, before = None, section = 'core') -> None:
+        """
+        Save the parsed data for a section of the sheet, along with the fingerprint of the file it came from.
+        Give the fingerprint taken before parsing as before, and if the file changed while it was
+        being parsed nothing is saved. Other sections cached for the same file contents are kept.
+        """
+        try:
+            entry = fingerprint(sheet)
+        except OSError:
+            return
+        if before != None and before != entry:
+            return
+        try:
+            with open(self.__entry_path__(sheet)) as file:
+                old = json.load(file)
+            if old.get('path') == entry['path'] and old.get('hash') == entry['hash']:
+                entry = dict(old, **entry)
+        except (OSError, ValueError):
+            pass
+        entry[section] = data
+        self.__write__(Path(sheet).resolve(), entry)
+
+    def __write__(self, sheet: Path, entry: dict) -> None:
+        """
+        Write through a temp file so a half written entry is never read. A cache that can't be
+        written is only slower, so failures are logged and ignored.
+        """
+        path = self.__entry_path__(sheet)
+        tmpPath = path.with_suffix('.tmp')
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            with open(tmpPath, 'w') as file:
+                json.dump(entry, file, separators=(',', ':'))
+            tmpPath.replace(path)
+        except OSError as err:
+            logger.warning(f"Couldn't write sheet cache {path}: {err}")
@@ -0,0 +1,131 @@
+"""
+Droid Bot Assistant > sheetwatch.py | Watches the character folder for sheets that change on disk.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from pathlib import Path
+from threading import Thread, Event
+from time import monotonic
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+
+logger = logging.getLogger(__name__)
+
+#From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+#wd, mask, cookie and the length of the name that follows
+EVENT = struct.Struct('iIII')
+
+def load_inotify():
+    """
+    Returns libc if it has inotify, Linux only, otherwise None.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class SheetWatcher(Thread):
+    """
+    Watches folder for PDFs that are written or moved in, and calls changed(path) from this thread
+    once a file has been quiet for delay seconds, so an editor saving in bursts gives one call.
+    Uses inotify where there is one, and otherwise checks the modified time and size of every PDF
+    each interval seconds.
+    """
+    def __init__(self, folder: Path, changed, delay = 1.0, interval = 2.0) -> None:
+        super().__init__(name='SheetWatcher', daemon=True)
+        self.folder = Path(folder)
+        self.changed = changed
+        self.delay = delay
+        self.interval = interval
+        self.pending = dict() #Path to the time it's due
+        self.stopped = Event()
+
+    def __scan__(self) -> dict:
+        found = dict()
+        for sheet in self.folder.glob("*.pdf"):
+            try:
+                info = sheet.stat()
+            except OSError: #Deleted while we looked
+                continue
+            found[sheet] = (info.st_mtime_ns, info.st_size)
+        return found
+
+    def __wait__(self) -> float:
+        """How long to block before something is due, or the poll comes round."""
+        if len(self.pending) == 0:
+            return self.interval
+        return max(0.0, min(min(self.pending.values()) - monotonic(), self.interval))
+
+    def __fire__(self) -> None:
+        now = monotonic()
+        for sheet in [sheet for sheet, due in self.pending.items() if due <= now]:
+            del self.pending[sheet]
+            try:
+                self.changed(sheet)
+            except Exception: #One bad sheet mustn't kill the watcher
+                logger.exception(f"Failed reloading {sheet}")
+
+    def run(self) -> None:
+        libc = load_inotify()
+        fd = -1
+        if libc != None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, str(self.folder).encode(), IN_CLOSE_WRITE | IN_MOVED_TO | IN_MODIFY | IN_CREATE) < 0:
+                os.close(fd)
+                fd = -1
+        if fd < 0:
+            logger.info(f"Polling {self.folder} for changed sheets every {self.interval}s")
+            self.__poll__()
+        else:
+            logger.info(f"Watching {self.folder} for changed sheets with inotify")
+            try:
+                self.__notify__(fd)
+            finally:
+                os.close(fd)
+
+    def __notify__(self, fd: int) -> None:
+        while not self.stopped.is_set():
+            ready, _, _ = select.select([fd], [], [], self.__wait__())
+            if ready:
+                buffer = os.read(fd, 64 * 1024)
+                offset = 0
+                while offset < len(buffer):
+                    wd, mask, cookie, length = EVENT.unpack_from(buffer, offset)
+                    offset += EVENT.size
+                    name = buffer[offset:offset + length].rstrip(b'\0').decode(errors='ignore')
+                    offset += length
+                    if name.lower().endswith('.pdf'):
+                        self.pending[self.folder / name] = monotonic() + self.delay
+            self.__fire__()
+
+    def __poll__(self) -> None:
+        known = self.__scan__()
+        nextScan = monotonic() + self.interval
+        while not self.stopped.wait(self.__wait__()):
+            if monotonic() >= nextScan:
+                found = self.__scan__()
+                for sheet, info in found.items():
+                    if known.get(sheet) != info:
+                        self.pending[sheet] = monotonic() + self.delay
+                known = found
+                nextScan = monotonic() + self.interval
+            self.__fire__()
+
+    def stop(self) -> None:
+        self.stopped.set()
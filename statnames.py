@@ -0,0 +1,87 @@
+"""
+Droid Bot Assistant > statnames.py | Resolves what people type to the stat they meant.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from difflib import get_close_matches
+
+def normalize(text: str) -> str:
+    """Lowercase and drop the spaces, dashes, underscores and brackets, so 'Ranged (Light)' is 'rangedlight'."""
+    return ''.join(letter for letter in text.lower() if letter not in ' -_()')
+
+class StatResolver(object):
+    """
+    Maps names, aliases and unambiguous prefixes of them to a target, built once up front.
+    Whole names are one dict lookup. Anything else walks a trie where every node knows which
+    targets lie beneath it, so a prefix resolves if only one does. Returns None for anything that
+    doesn't resolve, and ambiguous() and suggest() say why.
+    """
+    def __init__(self) -> None:
+        self.exact = dict() #Normalized name to target
+        self.trie = dict() #Letter to child node, each a dict with its targets under ''
+        self.names = dict() #Target to its canonical name, for messages
+
+    def add(self, name: str, target, *aliases: str) -> None:
+        """
+        Add target under name, which is also how messages write it, and under any aliases.
+        """
+        self.names[target] = name
+        for each in (name,) + aliases:
+            key = normalize(each)
+            self.exact[key] = target
+            node = self.trie
+            for letter in key:
+                node = node.setdefault(letter, {'' : set()})
+                node[''].add(target)
+
+    def __node__(self, text: str):
+        node = self.trie
+        for letter in normalize(text):
+            node = node.get(letter)
+            if node == None:
+                return None
+        return node
+
+    def resolve(self, text: str):
+        """Returns the target text means, or None if it's unknown or ambiguous."""
+        target = self.exact.get(normalize(text))
+        if target != None:
+            return target
+        node = self.__node__(text)
+        if node == None or node is self.trie or len(node['']) != 1:
+            return None
+        return next(iter(node['']))
+
+    def ambiguous(self, text: str) -> list:
+        """The canonical names of everything text is a prefix of, sorted."""
+        node = self.__node__(text)
+        if node == None or node is self.trie:
+            return list()
+        return sorted(self.names[target] for target in node[''])
+
+    def suggest(self, text: str, count = 3) -> list:
+        """The canonical names of the closest matches to text, for typos."""
+        result = list()
+        for key in get_close_matches(normalize(text), self.exact.keys(), n=count * 2, cutoff=0.6):
+            name = self.names[self.exact[key]]
+            if name not in result:
+                result.append(name)
+        return result[:count]
+
+    def split(self, words: list) -> list:
+        """
+        Group words into stat names, preferring the longest run of words that is a whole name,
+        so ['ranged', 'light', 'cool'] is ['ranged light', 'cool'].
+        """
+        result = list()
+        i = 0
+        while i < len(words):
+            for end in range(len(words), i, -1):
+                if end - i == 1 or normalize(''.join(words[i:end])) in self.exact:
+                    result.append(' '.join(words[i:end]))
+                    i = end
+                    break
+        return result
@@ -0,0 +1,113 @@
+"""
+Droid Bot Assistant > statstore.py | Column store for the stats of a group of players.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from threading import RLock
+import numpy as np
+
+class StatStore(object):
+    """
+    Keeps one kind of stat per NumPy array, with a row for each player. columns is a dict of the
+    column name to the shape of one player's entry, so a column of shape (8,) is stored as a
+    players x 8 array. Group wide questions become a single operation over a column instead of
+    a loop over players and their dicts.
+    Every write goes through set(), set_row() or add(), which tell each of self.listeners
+    listener(column, rows) afterwards, so anything built on the columns can keep up.
+    """
+    def __init__(self, columns: dict, capacity = 8) -> None:
+        self.lock = RLock()
+        self.shapes = {name : tuple(shape) for name, shape in columns.items()}
+        self.columns = {name : np.zeros((capacity,) + shape, dtype=np.int64) for name, shape in self.shapes.items()}
+        self.used = np.zeros(capacity, dtype=bool)
+        self.listeners = list()
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def __grow__(self) -> None:
+        capacity = len(self.used) * 2
+        for name, array in self.columns.items():
+            grown = np.zeros((capacity,) + self.shapes[name], dtype=array.dtype)
+            grown[:len(array)] = array
+            self.columns[name] = grown
+        used = np.zeros(capacity, dtype=bool)
+        used[:len(self.used)] = self.used
+        self.used = used
+
+    def add_row(self) -> int:
+        """
+        Returns the index of a new, zeroed, row.
+        """
+        with self.lock:
+            free = np.flatnonzero(~self.used)
+            if len(free) == 0:
+                self.__grow__()
+                free = np.flatnonzero(~self.used)
+            row = int(free[0])
+            self.used[row] = True
+            return row
+
+    def remove_row(self, row: int) -> None:
+        with self.lock:
+            for array in self.columns.values():
+                array[row] = 0
+            self.used[row] = False
+            self.__changed__(None, [row])
+
+    def rows(self) -> np.ndarray:
+        """The index of every row in use."""
+        return np.flatnonzero(self.used)
+
+    def get(self, column: str, rows) -> np.ndarray:
+        """
+        Returns a copy of the rows of a column, so it stays as it was even if the store changes.
+        """
+        with self.lock:
+            return self.columns[column][rows].copy()
+
+    def set(self, column: str, row: int, value, index = ()) -> None:
+        """
+        Set one player's entry of a column, a value or sequence the shape of it.
+        Give index to set just that part of the entry.
+        """
+        with self.lock:
+            self.columns[column][(row,) + tuple(index)] = value
+            self.__changed__(column, [row])
+
+    def set_row(self, row: int, values: dict) -> None:
+        """
+        Set one player's entry of every column in values at once, a dict of column name to value.
+        """
+        with self.lock:
+            for column, value in values.items():
+                self.columns[column][row] = value
+            for column in values:
+                self.__changed__(column, [row])
+
+    def add(self, column: str, rows, index: tuple, value: int, floor = None) -> tuple:
+        """
+        Add value to the entry at index of each of rows in a column, kept at floor or above if given.
+        Returns arrays of the (old, new) values of each row. Raises OverflowError, changing nothing,
+        if any of them would go past what the column can hold instead of letting it wrap around.
+        """
+        with self.lock:
+            array = self.columns[column]
+            key = (np.asarray(rows),) + tuple(index)
+            old = array[key].copy()
+            limits = np.iinfo(array.dtype)
+            if old.size > 0 and not (limits.min <= int(old.min()) + value and int(old.max()) + value <= limits.max):
+                raise OverflowError(f"Adding {value} to {column} would go past {limits.min} to {limits.max}")
+            new = old + value
+            if floor != None:
+                np.maximum(new, floor, out=new)
+            array[key] = new
+            self.__changed__(column, rows)
+        return old, new
+
+    def __changed__(self, column, rows) -> None:
+        for listener in self.listeners:
+            listener(column, rows)
@@ -0,0 +1,153 @@
+"""
+Droid Bot Assistant > store.py | Fast storage backends for character sheets, so the PDFs are only touched on demand.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from threading import Lock
+import json
+import os
+import sqlite3
+
+from player import PlayerError, PlayerCharacter
+
+class SheetBackend(ABC):
+    """
+    Somewhere to keep characters other than their PDF. Each is kept by name as the dict
+    PlayerCharacter.to_data(withTalents=True) gives, along with the PDF it came from so it
+    can be exported back to it. Backends have to give names(), get(), put() and describe(),
+    or they can't be made at all.
+    """
+    @abstractmethod
+    def names(self) -> list:
+        """Returns the name of every character kept."""
+
+    @abstractmethod
+    def get(self, name: str) -> tuple:
+        """Returns (PDF path, data) of a character, or raises PlayerError if there's none by that name."""
+
+    @abstractmethod
+    def put(self, data: dict, pdf: Path) -> None:
+        """Save a character's data, replacing any already kept under its name."""
+
+    @abstractmethod
+    def describe(self, name: str) -> str:
+        """Where a character is kept, for telling the user."""
+
+    def close(self) -> None:
+        pass
+
+    def load(self, name: str) -> PlayerCharacter:
+        """
+        Returns the character as a PlayerCharacter that saves back here instead of to the PDF.
+        """
+        pdf, data = self.get(name.lower())
+        return PlayerCharacter(Path(pdf), data, self)
+
+    def import_pdf(self, pdf: Path) -> PlayerCharacter:
+        """
+        Parse a PDF sheet, talents and all, keep it here and return it as a PlayerCharacter
+        that saves back here.
+        """
+        player = PlayerCharacter(Path(pdf))
+        self.put(player.to_data(withTalents=True), player.fileName)
+        return self.load(player.name)
+
+class JsonSheets(SheetBackend):
+    """
+    Keeps each character as '[name].json' in folder.
+    """
+    def __init__(self, folder: Path) -> None:
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def __path__(self, name: str) -> Path:
+        if Path(name).name != name: #Names come from chat, don't let them wander out of the folder.
+            raise PlayerError(f"Invalid character name: {name}")
+        return self.folder / f"{name}.json"
+
+    def names(self) -> list:
+        return sorted(path.stem for path in self.folder.glob("*.json"))
+
+    def get(self, name: str) -> tuple:
+        try:
+            with open(self.__path__(name)) as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            raise PlayerError(f"No saved character named {name}. Try /importpdf")
+        except ValueError:
+            raise PlayerError(f"Saved character {name} is corrupt: {self.__path__(name)}")
+        return entry['pdf'], entry['sheet']
+
+    def put(self, data: dict, pdf: Path) -> None:
+        path = self.__path__(data['name'])
+        tmpPath = path.with_suffix('.tmp')
+        try:
+            with open(tmpPath, 'w') as file:
+                json.dump({'pdf' : str(pdf), 'sheet' : data}, file, indent=1)
+                file.flush()
+                os.fsync(file.fileno())
+            tmpPath.replace(path)
+        except OSError:
+            raise PlayerError(f"Error: Cannot write to {path}")
+
+    def describe(self, name: str) -> str:
+        return str(self.__path__(name))
+
+class SqliteSheets(SheetBackend):
+    """
+    Keeps every character in one SQLite database, a row each.
+    The connection is shared by the command and save threads, so it's used under a lock.
+    """
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS sheets (name TEXT PRIMARY KEY, pdf TEXT NOT NULL, data TEXT NOT NULL)")
+
+    def names(self) -> list:
+        with self.lock:
+            return [row[0] for row in self.db.execute("SELECT name FROM sheets ORDER BY name")]
+
+    def get(self, name: str) -> tuple:
+        with self.lock:
+            row = self.db.execute("SELECT pdf, data FROM sheets WHERE name = ?", (name,)).fetchone()
+        if row == None:
+            raise PlayerError(f"No saved character named {name}. Try /importpdf")
+        return row[0], json.loads(row[1])
+
+    def put(self, data: dict, pdf: Path) -> None:
+        try:
+            with self.lock, self.db:
+                self.db.execute("INSERT OR REPLACE INTO sheets (name, pdf, data) VALUES (?, ?, ?)",
+                    (data['name'], str(pdf), json.dumps(data, separators=(',', ':'))))
+        except sqlite3.Error as err:
+            raise PlayerError(f"Error: Cannot save {data['name']} to {self.path}: {err}")
+
+    def describe(self, name: str) -> str:
+        return f"{self.path} ({name})"
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+def open_backend(kind: str, folder: Path):
+    """
+    Returns the backend named by kind, 'sqlite' or 'json', kept in folder. Or None for 'pdf',
+    which keeps working straight from the PDFs.
+    """
+    kind = kind.lower()
+    if kind == 'pdf':
+        return None
+    if kind == 'sqlite':
+        return SqliteSheets(Path(folder) / 'sheets.sqlite')
+    if kind == 'json':
+        return JsonSheets(Path(folder) / 'sheets')
+    raise ValueError(f"Unknown sheet backend {kind!r}, expected 'pdf', 'sqlite' or 'json'")
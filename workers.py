@@ -0,0 +1,31 @@
+"""
+Droid Bot Assistant > workers.py | The process pool shared by everything CPU bound.
+Copyright (C) Shelby Tucker 2020
+
+This file is part of 'Droid Assistant Bot', which is released under the MIT license.
+Please see the license file that was included with this software.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+import multiprocessing
+import os
+
+#How many processes the pool runs, one per CPU.
+WORKERS = os.cpu_count() or 1
+
+executor = None
+executorLock = Lock()
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    The process pool is started on first use and kept for the life of the bot. Sheet parsing
+    and dice estimates share it, so the bot never runs more than WORKERS processes.
+    Workers come from a forkserver, not forked from the bot, since by the time the pool starts
+    the bot is running threads and a fork can copy one of their locks while it's held.
+    """
+    global executor
+    with executorLock:
+        if executor == None:
+            executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('forkserver'))
+        return executor